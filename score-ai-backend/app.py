@@ -3,6 +3,7 @@ from flask import Flask
 from flasgger import Swagger
 from flask_cors import CORS
 from modules.health.routers import health_bp
+from modules.metrics.routers import metrics_bp
 from modules.auth.routers import auth_bp
 from modules.analysis.routers import analysis_bp
 from modules.chat.routers import chat_bp
@@ -30,6 +31,7 @@ def create_app():
     )
     Swagger(app)
     app.register_blueprint(health_bp, url_prefix='/health')
+    app.register_blueprint(metrics_bp, url_prefix='/metrics')
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(analysis_bp, url_prefix='/analysis')
     app.register_blueprint(chat_bp, url_prefix='/chat')
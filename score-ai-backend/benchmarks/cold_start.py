@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MEASURE_SNIPPET = """
+import json, logging, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+logging.disable(logging.CRITICAL)
+response = main.app.test_client().get('/health/')
+first_request = time.perf_counter()
+from core.storage import storage_service
+from core.firestore import firestore_service
+storage_service.client.bucket(storage_service.bucket_name).blob('cold-start-probe')
+firestore_service.db.collection('jobs').document('cold-start-probe')
+first_clients = time.perf_counter()
+print(json.dumps({
+    'import_ms': round((imported - started) * 1000, 1),
+    'first_request_ms': round((first_request - imported) * 1000, 1),
+    'first_client_use_ms': round((first_clients - first_request) * 1000, 1),
+    'status': response.status_code,
+}))
+"""
+
+
+def write_fake_service_account(path: str):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode("ascii")
+    with open(path, "w") as f:
+        json.dump({
+            "type": "service_account",
+            "project_id": "cold-start-bench",
+            "private_key_id": "bench",
+            "private_key": pem,
+            "client_email": "bench@cold-start-bench.iam.gserviceaccount.com",
+            "client_id": "0",
+            "token_uri": "https://oauth2.googleapis.com/token",
+        }, f)
+
+
+def measure_once(root: str, env: dict) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_SNIPPET], cwd=root, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start cost of importing main and serving the first request.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--root", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help="Backend checkout to measure, e.g. a git worktree of an older commit.")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        credentials_path = os.path.join(tmp_dir, "service-account.json")
+        write_fake_service_account(credentials_path)
+        env = {
+            **os.environ,
+            "PROJECT_ID": "cold-start-bench",
+            "STORAGE_BUCKET": "cold-start-bench",
+            "GEMINI_API_KEY": "bench",
+            "GOOGLE_API_KEY": "bench",
+            "GOOGLE_APPLICATION_CREDENTIALS": credentials_path,
+            "PYTHONDONTWRITEBYTECODE": "1",
+        }
+        runs = [measure_once(args.root, env) for _ in range(args.runs)]
+    summary = {"root": args.root, "runs": len(runs)}
+    for key in ("import_ms", "first_request_ms", "first_client_use_ms", "process_ms"):
+        summary[f"{key}_median"] = round(statistics.median(run[key] for run in runs), 1)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
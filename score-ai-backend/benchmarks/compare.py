@@ -0,0 +1,64 @@
+import argparse
+import json
+
+LOWER_IS_BETTER = ("_ms", "_mb", "calls", "tokens", "errors", "failed_jobs")
+WORKLOAD = {"jobs", "pages", "requests", "calls", "jobs_listed"}
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    values = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+
+def compare(base: dict, head: dict, threshold: float) -> list:
+    base_results = {(r["scenario"], r["case"]): flatten(r) for r in base["results"]}
+    rows = []
+    for result in head["results"]:
+        key = (result["scenario"], result["case"])
+        if key not in base_results:
+            continue
+        for metric, new in flatten(result).items():
+            old = base_results[key].get(metric)
+            if old is None:
+                continue
+            change = (new - old) / abs(old) if old else None
+            delta = new - old
+            worse = metric not in WORKLOAD and (delta > 0 if metric.endswith(LOWER_IS_BETTER) else delta < 0)
+            rows.append({
+                "scenario": key[0], "case": key[1], "metric": metric, "base": old, "head": new,
+                "change": None if change is None else round(change, 3),
+                "regression": worse and (change is None or abs(change) >= threshold),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two benchmarks.suite reports.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change reported as a regression.")
+    parser.add_argument("--json", action="store_true", help="Print the rows as JSON.")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    rows = compare(base, head, args.threshold)
+    if args.json:
+        print(json.dumps({"base": base.get("commit"), "head": head.get("commit"), "rows": rows}, indent=2))
+        return
+    print(f"base {base.get('commit')}  head {head.get('commit')}")
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        change = "" if row["change"] is None else f"{row['change']:+.1%}"
+        print(f"{row['scenario']:6} {row['case']:14} {row['metric']:32} {row['base']:>12} {row['head']:>12} "
+              f"{change:>8} {flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import io
+import random
+import fitz
+from PIL import Image, ImageDraw
+
+PAGE_COUNTS = (1, 10, 100, 500)
+KINDS = ("text", "scanned", "mixed")
+
+
+def _text_page(document: fitz.Document, rng: random.Random, page_number: int, problems: int = 8):
+    page = document.new_page(width=612, height=792)
+    page.insert_text((72, 60), f"Problem set - page {page_number}", fontsize=14)
+    for index in range(problems):
+        a, b, c = rng.randint(2, 40), rng.randint(1, 99), rng.randint(1, 500)
+        y = 100 + index * 80
+        page.insert_text((72, y), f"{index + 1}. Solve {a}x^2 + {b}x - {c} = 0 and check both roots.", fontsize=11)
+        page.insert_text((90, y + 18), f"Then evaluate f({b}) for f(x) = {a}x + {c} / {b}.", fontsize=11)
+
+
+def _scan(rng: random.Random, width: int, height: int) -> bytes:
+    noise = bytes(rng.getrandbits(8) for _ in range(width * height // 16))
+    image = Image.frombytes("L", (width // 4, height // 4), noise).resize((width, height))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def build_text_pdf(page_count: int, seed: int = 0) -> bytes:
+    """Born-digital worksheet: every page has a text layer with distinct problems."""
+    rng = random.Random(seed)
+    with fitz.open() as document:
+        for page_number in range(1, page_count + 1):
+            _text_page(document, rng, page_number)
+        return document.tobytes()
+
+
+def build_scanned_pdf(page_count: int, seed: int = 0, width: int = 850, height: int = 1100) -> bytes:
+    """Scanned upload: every page is one full-page JPEG and has no text layer."""
+    rng = random.Random(seed or page_count)
+    with fitz.open() as document:
+        for _ in range(page_count):
+            page = document.new_page(width=612, height=792)
+            page.insert_image(page.rect, stream=_scan(rng, width, height))
+        return document.tobytes()
+
+
+def build_mixed_pdf(page_count: int, seed: int = 0) -> bytes:
+    """Realistic bulk upload: text pages with a cover, blank backs and a repeated page mixed in."""
+    rng = random.Random(seed)
+    with fitz.open() as document:
+        for page_number in range(1, page_count + 1):
+            if page_number == 1:
+                document.new_page(width=612, height=792).insert_text((200, 300), "Homework Packet", fontsize=24)
+            elif page_number % 10 == 0:
+                document.new_page(width=612, height=792)
+            elif page_number % 25 == 0:
+                document.fullcopy_page(page_number - 2)
+            elif page_number % 7 == 0:
+                page = document.new_page(width=612, height=792)
+                page.insert_image(fitz.Rect(72, 72, 540, 720), stream=_scan(rng, 425, 550))
+            else:
+                _text_page(document, rng, page_number)
+        return document.tobytes()
+
+
+def build_pdf(kind: str, page_count: int, seed: int = 0) -> bytes:
+    builders = {"text": build_text_pdf, "scanned": build_scanned_pdf, "mixed": build_mixed_pdf}
+    return builders[kind](page_count, seed=seed)
+
+
+def build_photo(seed: int = 0, width: int = 3000, height: int = 4000) -> bytes:
+    """Phone photo of a handwritten page, as uploaded through the image path."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (236, 232, 224))
+    draw = ImageDraw.Draw(image)
+    for line in range(24):
+        y = 200 + line * 150
+        x = 200
+        while x < width - 300:
+            step = rng.randint(30, 90)
+            draw.line((x, y + rng.randint(-20, 20), x + step, y + rng.randint(-20, 20)), fill=(40, 40, 60), width=6)
+            x += step + rng.randint(0, 40)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
@@ -0,0 +1,435 @@
+import contextlib
+import datetime
+import functools
+import math
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeModels:
+    """Stand-in for ``genai.Client().models`` with a server-side quota.
+
+    Calls above ``max_concurrency`` or ``requests_per_minute`` fail with 429,
+    ``error_rate`` of the rest fail with one of ``error_codes``, and latency grows with load.
+    ``distribution`` is ``uniform`` (``latency`` plus up to ``jitter`` seconds) or
+    ``lognormal`` (median ``latency``, ``jitter`` as the shape parameter), which gives the long tail
+    real model calls have.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, max_concurrency: int = 8,
+                 requests_per_minute: int = 0, error_rate: float = 0.0, seed: int = 0, respond=None,
+                 distribution: str = "uniform", error_codes: tuple = (503,)):
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.error_codes = error_codes
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.error_rate = error_rate
+        self.respond = respond or (lambda kwargs: SimpleNamespace(text="ok", parsed=None))
+        self.random = random.Random(seed)
+        self.in_flight = 0
+        self.calls = 0
+        self.rejected = 0
+        self.recent = deque()
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            if self.in_flight >= self.max_concurrency or (
+                self.requests_per_minute and len(self.recent) >= self.requests_per_minute
+            ):
+                self.rejected += 1
+                raise FakeAPIError(429, "RESOURCE_EXHAUSTED")
+            self.recent.append(now)
+            self.in_flight += 1
+            load = self.in_flight / self.max_concurrency
+            fail = self.error_codes and self.random.random() < self.error_rate
+            code = self.random.choice(self.error_codes) if fail else None
+            if self.distribution == "lognormal":
+                base = self.random.lognormvariate(math.log(self.latency), self.jitter) if self.latency > 0 else 0.0
+            else:
+                base = self.latency + self.random.uniform(0, self.jitter)
+            delay = base + self.latency * load
+        return delay, code
+
+    def generate_content(self, **kwargs):
+        delay, code = self._admit()
+        try:
+            time.sleep(delay)
+            if code:
+                raise FakeAPIError(code, "UNAVAILABLE" if code >= 500 else "FAILED")
+            response = self.respond(kwargs)
+            if getattr(response, "usage_metadata", None) is None:
+                response.usage_metadata = SimpleNamespace(
+                    prompt_token_count=300, candidates_token_count=200, total_token_count=500
+                )
+            return response
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def generate_content_stream(self, **kwargs):
+        response = self.generate_content(**kwargs)
+        for word in (response.text or "").split(" "):
+            yield SimpleNamespace(text=word + " ", usage_metadata=response.usage_metadata)
+
+
+class FakeCaches:
+    def __init__(self):
+        self.created = 0
+
+    def create(self, model: str, config=None):
+        self.created += 1
+        return SimpleNamespace(name=f"cachedContents/{uuid.uuid4().hex}", model=model)
+
+
+class FakeGeminiClient:
+    def __init__(self, **kwargs):
+        self.models = FakeModels(**kwargs)
+        self.caches = FakeCaches()
+
+
+class FakeBlob:
+    def __init__(self, bucket, name: str, chunk_size: int = None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+
+    @property
+    def content_type(self):
+        return self.bucket.objects.get(self.name, (None, None))[1]
+
+    @property
+    def size(self):
+        data = self.bucket.objects.get(self.name, (None, None))[0]
+        return None if data is None else len(data)
+
+    def exists(self) -> bool:
+        return self.name in self.bucket.objects
+
+    def upload_from_string(self, data, content_type: str = None):
+        self.bucket.client.rpc()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.bucket.objects[self.name] = (bytes(data), content_type or "application/octet-stream")
+
+    def upload_from_file(self, file_obj, content_type: str = None, **kwargs):
+        self.upload_from_string(file_obj.read(), content_type=content_type)
+
+    def download_as_bytes(self) -> bytes:
+        self.bucket.client.rpc()
+        if self.name not in self.bucket.objects:
+            raise FileNotFoundError(f"gs://{self.bucket.name}/{self.name}")
+        return self.bucket.objects[self.name][0]
+
+    def delete(self):
+        self.bucket.client.rpc()
+        self.bucket.objects.pop(self.name, None)
+
+    def generate_signed_url(self, **kwargs) -> str:
+        return f"https://storage.example/{self.bucket.name}/{self.name}?signed"
+
+
+class FakeBucket:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self.objects = {}
+
+    def blob(self, name: str, chunk_size: int = None) -> FakeBlob:
+        return FakeBlob(self, name, chunk_size)
+
+
+class FakeStorageClient:
+    """In-memory stand-in for ``google.cloud.storage.Client``; every object call sleeps ``latency``."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.buckets = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def rpc(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def bucket(self, name: str) -> FakeBucket:
+        with self._lock:
+            return self.buckets.setdefault(name, FakeBucket(self, name))
+
+    def batch(self, raise_exception: bool = True):
+        return contextlib.nullcontext()
+
+
+def _apply_transforms(current: dict, data: dict, nested: bool) -> dict:
+    from google.cloud.firestore_v1 import transforms
+    document = dict(current)
+    for path, value in data.items():
+        keys = path.split(".") if nested else [path]
+        target = document
+        for key in keys[:-1]:
+            target[key] = dict(target.get(key) or {})
+            target = target[key]
+        if value is transforms.SERVER_TIMESTAMP:
+            value = datetime.datetime.now(datetime.timezone.utc)
+        elif isinstance(value, transforms.Increment):
+            value = (target.get(keys[-1]) or 0) + value.value
+        if value is transforms.DELETE_FIELD:
+            target.pop(keys[-1], None)
+        else:
+            target[keys[-1]] = value
+    return document
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data: dict = None, field_paths: list = None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        if data is not None and field_paths is not None:
+            data = {key: value for key, value in data.items() if key in field_paths}
+        self._data = data
+
+    def to_dict(self):
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field: str):
+        value = self._data
+        for key in field.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        return value
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path: tuple):
+        self._client = client
+        self.path = "/".join(path)
+        self._path = path
+        self.id = path[-1]
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self._path[:-1])
+
+    def collection(self, name: str):
+        return FakeCollectionReference(self._client, self._path + (name,))
+
+    def get(self, field_paths: list = None, transaction=None) -> FakeDocumentSnapshot:
+        self._client.rpc()
+        with self._client.lock:
+            return FakeDocumentSnapshot(self, self._client.documents.get(self._path), field_paths)
+
+    def set(self, data: dict, merge: bool = False):
+        self._client.rpc()
+        self._client.write(self._path, data, merge=merge)
+
+    def update(self, data: dict):
+        self._client.rpc()
+        self._client.write(self._path, data, update=True)
+
+    def create(self, data: dict):
+        self.set(data)
+
+    def delete(self):
+        self._client.rpc()
+        self._client.delete(self._path)
+
+    def on_snapshot(self, callback):
+        return SimpleNamespace(unsubscribe=lambda: None)
+
+
+class FakeQuery:
+    def __init__(self, client, path: tuple, filters: tuple = (), orders: tuple = (), fields: list = None,
+                 limit: int = None, cursor: dict = None):
+        self._client = client
+        self._path = path
+        self._filters = filters
+        self._orders = orders
+        self._fields = fields
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, fields=self._fields, limit=self._limit,
+                     cursor=self._cursor)
+        state.update(changes)
+        return FakeQuery(self._client, self._path, **state)
+
+    def where(self, field: str, op: str, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field: str, direction: str = "ASCENDING"):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def select(self, fields: list):
+        return self._copy(fields=list(fields))
+
+    def limit(self, count: int):
+        return self._copy(limit=count)
+
+    def start_after(self, values: dict):
+        return self._copy(cursor=values)
+
+    def on_snapshot(self, callback):
+        return SimpleNamespace(unsubscribe=lambda: None)
+
+    @staticmethod
+    def _value(doc_id: str, data: dict, field: str):
+        return doc_id if field == "__name__" else data.get(field)
+
+    def _matches(self, doc_id: str, data: dict) -> bool:
+        operators = {
+            "==": lambda a, b: a == b, "!=": lambda a, b: a != b, "<": lambda a, b: a < b,
+            "<=": lambda a, b: a <= b, ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+            "in": lambda a, b: a in b, "array_contains": lambda a, b: b in (a or []),
+        }
+        for field, op, value in self._filters:
+            current = self._value(doc_id, data, field)
+            if current is None or not operators[op](current, value):
+                return False
+        return all(self._value(doc_id, data, field) is not None for field, _ in self._orders)
+
+    def _compare(self, left: tuple, right: tuple) -> int:
+        for (field, direction), a, b in zip(self._orders, left, right):
+            if a != b:
+                result = -1 if a < b else 1
+                return -result if direction == "DESCENDING" else result
+        return 0
+
+    def stream(self, transaction=None):
+        self._client.rpc()
+        with self._client.lock:
+            matches = [
+                (path, dict(data)) for path, data in self._client.documents.items()
+                if path[:-1] == self._path and self._matches(path[-1], data)
+            ]
+        keys = {path: tuple(self._value(path[-1], data, field) for field, _ in self._orders) for path, data in matches}
+        matches.sort(key=functools.cmp_to_key(lambda a, b: self._compare(keys[a[0]], keys[b[0]])))
+        if self._cursor is not None:
+            cursor = tuple(self._cursor.get(field) for field, _ in self._orders)
+            matches = [(path, data) for path, data in matches if self._compare(keys[path], cursor) > 0]
+        if self._limit is not None:
+            matches = matches[:self._limit]
+        for path, data in matches:
+            yield FakeDocumentSnapshot(FakeDocumentReference(self._client, path), data, self._fields)
+
+    def get(self, transaction=None) -> list:
+        return list(self.stream())
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path: tuple):
+        super().__init__(client, path)
+        self.id = path[-1]
+
+    def document(self, document_id: str = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._client, self._path + (document_id or uuid.uuid4().hex[:20],))
+
+    def add(self, data: dict):
+        reference = self.document()
+        reference.set(data)
+        return None, reference
+
+    def list_documents(self):
+        self._client.rpc()
+        with self._client.lock:
+            paths = [path for path in self._client.documents if path[:-1] == self._path]
+        return [FakeDocumentReference(self._client, path) for path in paths]
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, data: dict, merge: bool = False):
+        self._writes.append(("set", reference, data, merge))
+
+    def update(self, reference, data: dict):
+        self._writes.append(("update", reference, data, False))
+
+    def delete(self, reference):
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self):
+        self._client.rpc()
+        with self._client.lock:
+            for kind, reference, data, merge in self._writes:
+                if kind == "delete":
+                    self._client.delete(reference._path)
+                else:
+                    self._client.write(reference._path, data, merge=merge, update=kind == "update")
+        self._writes = []
+
+
+class FakeBulkWriter(FakeWriteBatch):
+    def on_write_result(self, callback):
+        pass
+
+    def close(self):
+        self.commit()
+
+
+class FakeFirestoreClient:
+    """In-memory stand-in for ``google.cloud.firestore.Client`` covering the calls this backend makes.
+
+    Every round trip (document get/set/update, query stream, batch commit) sleeps ``latency`` and
+    is counted in ``calls``; ``writes`` logs ``(monotonic time, document path)`` for each committed
+    document so callers can see when a result became visible.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.documents = {}
+        self.calls = 0
+        self.writes = []
+        self.lock = threading.RLock()
+
+    def rpc(self):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def write(self, path: tuple, data: dict, merge: bool = False, update: bool = False):
+        with self.lock:
+            current = self.documents.get(path)
+            if update and current is None:
+                raise KeyError(f"No document to update: {'/'.join(path)}")
+            self.documents[path] = _apply_transforms((current or {}) if merge or update else {}, data, nested=update)
+            self.writes.append((time.monotonic(), "/".join(path)))
+
+    def delete(self, path: tuple):
+        with self.lock:
+            self.documents.pop(path, None)
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, (name,))
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def bulk_writer(self) -> FakeBulkWriter:
+        return FakeBulkWriter(self)
+
+    def get_all(self, references: list, field_paths: list = None):
+        self.rpc()
+        with self.lock:
+            return [FakeDocumentSnapshot(ref, self.documents.get(ref._path), field_paths) for ref in references]
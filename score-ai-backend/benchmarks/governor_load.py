@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PROJECT_ID", "benchmark")
+os.environ.setdefault("STORAGE_BUCKET", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from core.governor import AdaptiveConcurrencyLimiter, GeminiGovernor  # noqa: E402
+from benchmarks.fakes import FakeGeminiClient  # noqa: E402
+
+
+def run(mode: str, args) -> dict:
+    client = FakeGeminiClient(
+        latency=args.latency, max_concurrency=args.server_concurrency,
+        requests_per_minute=args.server_rpm, error_rate=args.error_rate, seed=1,
+    )
+    governor = GeminiGovernor(
+        requests_per_minute=args.rpm, tokens_per_minute=args.tpm, max_retries=args.retries,
+        retry_base_seconds=args.retry_base, retry_max_seconds=2.0, call_timeout_seconds=30,
+        deadline_seconds=60, concurrency=AdaptiveConcurrencyLimiter(
+            initial=args.initial_concurrency, minimum=1, maximum=args.clients, latency_target=args.latency * 4,
+        ),
+    )
+
+    def call(_):
+        started = time.monotonic()
+        try:
+            if mode == "governed":
+                governor.generate_content(client, model="fake", contents=["prompt"])
+            else:
+                client.models.generate_content(model="fake", contents=["prompt"])
+            return True, time.monotonic() - started
+        except Exception:
+            return False, time.monotonic() - started
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        outcomes = list(executor.map(call, range(args.requests)))
+    elapsed = time.monotonic() - started
+    latencies = sorted(latency for ok, latency in outcomes if ok)
+    succeeded = len(latencies)
+    return {
+        "mode": mode,
+        "requests": args.requests,
+        "succeeded": succeeded,
+        "failed": args.requests - succeeded,
+        "upstream_calls": client.models.calls,
+        "upstream_429": client.models.rejected,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(succeeded / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None,
+        "governor": governor.snapshot() if mode == "governed" else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Gemini governor against a fake, quota-limited model.")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent callers.")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--server-concurrency", type=int, default=8)
+    parser.add_argument("--server-rpm", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--tpm", type=int, default=0)
+    parser.add_argument("--retries", type=int, default=6)
+    parser.add_argument("--retry-base", type=float, default=0.05)
+    parser.add_argument("--initial-concurrency", type=int, default=16)
+    args = parser.parse_args()
+    for mode in ("ungoverned", "governed"):
+        print(json.dumps(run(mode, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import base64
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PROJECT_ID", "benchmark")
+os.environ.setdefault("STORAGE_BUCKET", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from config import settings  # noqa: E402
+from benchmarks.fakes import FakeGeminiClient  # noqa: E402
+
+PAGE_LABEL = re.compile(r"^Page (\d+)$")
+
+
+def questions_on_page(page_number: int) -> int:
+    return page_number % 3
+
+
+class FakePageModel:
+    """Answers every page in a request with a known set of questions.
+
+    Generation time grows by ``page_latency`` per page in the request. Each answer is attributed to a wrong page of the same request with
+    probability ``misattribution * (pages - 1)`` to model packing errors.
+    """
+
+    def __init__(self, misattribution: float, page_latency: float, seed: int = 0):
+        self.misattribution = misattribution
+        self.page_latency = page_latency
+        self.random = random.Random(seed)
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, kwargs: dict):
+        from core.schemas import PageProcessingResponse, QuestionAnswer
+        contents = kwargs["contents"]
+        pages = [
+            int(base64.b64decode(item["inline_data"]["data"]).decode()[len("page-"):])
+            for item in contents if isinstance(item, dict)
+        ]
+        labelled = any(isinstance(item, str) and PAGE_LABEL.match(item) for item in contents)
+        answers = []
+        with self._lock:
+            for page_number in pages:
+                for index in range(questions_on_page(page_number)):
+                    attributed = page_number if labelled else None
+                    if len(pages) > 1 and self.random.random() < self.misattribution * (len(pages) - 1):
+                        attributed = self.random.choice([n for n in pages if n != page_number])
+                    answers.append(QuestionAnswer(
+                        question=f"p{page_number}-q{index}", answer="42", is_homework_problem=True, page_number=attributed,
+                    ))
+            prompt_tokens = sum(len(item) // 4 for item in contents if isinstance(item, str)) + 258 * len(pages)
+            output_tokens = 150 * len(answers)
+            self.tokens += prompt_tokens + output_tokens
+        time.sleep(self.page_latency * len(pages))
+        return SimpleNamespace(
+            text="", parsed=PageProcessingResponse(questions_and_answers=answers),
+            usage_metadata=SimpleNamespace(total_token_count=prompt_tokens + output_tokens),
+        )
+
+
+def run(pack_size: int, max_pack_size: int, args) -> dict:
+    from core import clients
+    from modules.processing.services import ProcessingService
+    settings.PROCESSING_PACK_SIZE = pack_size
+    settings.PROCESSING_PACK_MAX_SIZE = max_pack_size
+    model = FakePageModel(args.misattribution, args.page_latency, seed=pack_size)
+    client = FakeGeminiClient(latency=args.latency, jitter=0, max_concurrency=1000, respond=model)
+    clients.set_client("genai", client)
+    service = ProcessingService()
+    pages = [(n, f"page-{n}".encode()) for n in range(1, args.pages + 1)]
+    started = time.monotonic()
+    results = service.process_pages("benchmark", pages, writer=mock.MagicMock())
+    elapsed = time.monotonic() - started
+    expected = sum(questions_on_page(n) for n, _ in pages)
+    correct = sum(
+        1 for page_number, page_results in enumerate(results, start=1)
+        for qa in page_results if qa["question"].startswith(f"p{page_number}-")
+    )
+    return {
+        "mode": "per-page" if max_pack_size == 1 else f"pack K={pack_size}" + (" adaptive" if max_pack_size > pack_size else ""),
+        "pages": args.pages,
+        "requests": client.models.calls,
+        "elapsed_s": round(elapsed, 2),
+        "tokens": model.tokens,
+        "tokens_per_page": round(model.tokens / args.pages),
+        "questions_expected": expected,
+        "questions_on_correct_page": correct,
+        "accuracy": round(correct / expected, 3) if expected else 1.0,
+        "final_pack_size": service.pack_sizer.current(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-page and packed Gemini requests on a fake model.")
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake seconds per request, scaled by load.")
+    parser.add_argument("--page-latency", type=float, default=0.1, help="Extra fake seconds per page in a request.")
+    parser.add_argument("--misattribution", type=float, default=0.0,
+                        help="Chance per extra packed page that an answer is filed under the wrong page.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[2, 4, 8])
+    args = parser.parse_args()
+    import logging
+    logging.disable(logging.WARNING)
+    settings.PAGE_CACHE_BACKEND = "none"
+    settings.PAGE_IMAGE_ENABLED = False
+    settings.PAGE_TEXT_ENABLED = False
+    settings.PAGE_FILTER_ENABLED = False
+    print(json.dumps(run(1, 1, args)))
+    for size in args.sizes:
+        print(json.dumps(run(size, size, args)))
+    print(json.dumps(run(2, max(args.sizes), args)))
+
+
+if __name__ == "__main__":
+    main()
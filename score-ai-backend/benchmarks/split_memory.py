@@ -0,0 +1,74 @@
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from collections import deque
+import fitz
+
+from benchmarks.corpus import build_scanned_pdf
+
+PAGE_COUNTS = (10, 100, 500)
+
+
+def split_eager(file_bytes: bytes, in_flight: int):
+    pdf_document = fitz.open(stream=file_bytes, filetype="pdf")
+    page_pdfs = []
+    for page_num in range(len(pdf_document)):
+        single_page_pdf = fitz.open()
+        single_page_pdf.insert_pdf(pdf_document, from_page=page_num, to_page=page_num)
+        pdf_byte_arr = io.BytesIO()
+        single_page_pdf.save(pdf_byte_arr)
+        single_page_pdf.close()
+        page_pdfs.append(pdf_byte_arr.getvalue())
+    pdf_document.close()
+    return sum(len(page) for page in page_pdfs)
+
+
+def split_lazy(file_bytes: bytes, in_flight: int):
+    from core.pdf import open_pdf, iter_pdf_pages
+    window = deque(maxlen=in_flight)
+    total = 0
+    for page_bytes in iter_pdf_pages(open_pdf(file_bytes)):
+        window.append(page_bytes)
+        total += len(page_bytes)
+    return total
+
+
+def measure(mode: str, path: str, in_flight: int) -> dict:
+    with open(path, "rb") as f:
+        file_bytes = f.read()
+    splitter = split_eager if mode == "eager" else split_lazy
+    page_bytes = splitter(file_bytes, in_flight)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"mode": mode, "file_bytes": len(file_bytes), "page_bytes": page_bytes, "peak_rss_mb": round(peak_kb / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of the eager and lazy PDF page splitters.")
+    parser.add_argument("--pages", type=int, nargs="*", default=list(PAGE_COUNTS))
+    parser.add_argument("--in-flight", type=int, default=4)
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure[0], args.measure[1], args.in_flight)))
+        return
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for page_count in args.pages:
+            path = os.path.join(tmp_dir, f"scanned-{page_count}.pdf")
+            with open(path, "wb") as f:
+                f.write(build_scanned_pdf(page_count))
+            for mode in ("eager", "lazy"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.split_memory", "--in-flight", str(args.in_flight), "--measure", mode, path],
+                    cwd=root, check=True, capture_output=True, text=True,
+                ).stdout
+                print(json.dumps({"pages": page_count, **json.loads(output)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PROJECT_ID", "benchmark")
+os.environ.setdefault("STORAGE_BUCKET", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("solve", "jobs", "chat")
+PAGE_LABEL = re.compile(r"^Page (\d+)$")
+CHAT_ANSWER = " ".join(
+    ["First isolate the variable, then apply the quadratic formula and check each root in the original equation."] * 8
+)
+
+
+def percentiles(values: list) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+    def pick(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def respond(kwargs: dict):
+    """Answers solve requests with one question per page and chat requests with a fixed explanation."""
+    from core.schemas import PageProcessingResponse, QuestionAnswer
+    config = kwargs.get("config")
+    if not (isinstance(config, dict) and config.get("response_schema")):
+        return SimpleNamespace(text=CHAT_ANSWER, parsed=None)
+    labels = [int(match.group(1)) for item in kwargs["contents"] if isinstance(item, str)
+              for match in [PAGE_LABEL.match(item)] if match]
+    answers = [
+        QuestionAnswer(question=f"Solve problem {n or 1}.", answer="x = 2", is_homework_problem=True, page_number=n)
+        for n in labels or [None]
+    ]
+    parsed = PageProcessingResponse(questions_and_answers=answers)
+    return SimpleNamespace(text=parsed.model_dump_json(), parsed=parsed)
+
+
+def install_fakes(args):
+    from core import clients
+    from benchmarks.fakes import FakeFirestoreClient, FakeGeminiClient, FakeStorageClient
+    clients.reset_clients()
+    env = SimpleNamespace(
+        genai=FakeGeminiClient(
+            latency=args.gemini_latency, jitter=args.gemini_jitter, distribution=args.gemini_distribution,
+            max_concurrency=args.gemini_concurrency, error_rate=args.gemini_error_rate, seed=args.seed,
+            respond=respond,
+        ),
+        storage=FakeStorageClient(latency=args.storage_latency),
+        firestore=FakeFirestoreClient(latency=args.firestore_latency),
+    )
+    clients.set_client("genai", env.genai)
+    clients.set_client("storage", env.storage)
+    clients.set_client("firestore", env.firestore)
+    return env
+
+
+def run_solve(args, kind: str, pages: int) -> dict:
+    from config import settings
+    from benchmarks.corpus import build_pdf
+    from core.firestore import firestore_service
+    from modules.processing.services import ProcessingService
+    env = install_fakes(args)
+    service = ProcessingService()
+    uploads = []
+    for repeat in range(args.repeat):
+        blob_name = f"benchmark/{kind}-{pages}-{repeat}.pdf"
+        env.storage.bucket(settings.STORAGE_BUCKET).blob(blob_name).upload_from_string(
+            build_pdf(kind, pages, seed=args.seed + repeat), content_type="application/pdf"
+        )
+        uploads.append(f"gs://{settings.STORAGE_BUCKET}/{blob_name}")
+    rss_before = peak_rss_mb()
+    job_latencies, page_latencies, failed = [], [], 0
+    total_started = time.monotonic()
+    for gcs_path in uploads:
+        job_id = firestore_service.create_job("benchmark-user", gcs_path).data["job_id"]
+        writes_before = len(env.firestore.writes)
+        started = time.monotonic()
+        result = service.solve_from_gcs_path(job_id, gcs_path)
+        job_latencies.append(time.monotonic() - started)
+        failed += not result.success
+        visible = {}
+        for written_at, path in env.firestore.writes[writes_before:]:
+            if path.startswith(f"jobs/{job_id}/results/"):
+                visible.setdefault(path, written_at - started)
+        page_latencies.extend(visible.values())
+    elapsed = time.monotonic() - total_started
+    jobs = [doc.to_dict() for doc in env.firestore.collection("jobs").stream()]
+    return {
+        "scenario": "solve",
+        "case": f"{kind}-{pages}",
+        "jobs": len(uploads),
+        "failed_jobs": failed,
+        "pages": pages * len(uploads),
+        "throughput_pages_per_s": round(pages * len(uploads) / elapsed, 2),
+        "job": percentiles(job_latencies),
+        "page_visible": percentiles(page_latencies),
+        "model_calls": env.genai.models.calls,
+        "firestore_calls": env.firestore.calls,
+        "tokens": sum((job.get("token_usage") or {}).get("total", 0) for job in jobs),
+        "skipped_pages": sum(sum((job.get("skipped_pages") or {}).values()) for job in jobs),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def seed_jobs(firestore, user_id: str, count: int):
+    started = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    for index in range(count):
+        job_id = f"{user_id}-{index:06d}"
+        job = {
+            "user_id": user_id,
+            "file_gcs_path": f"gs://benchmark/uploads/{job_id}.pdf",
+            "status": "completed" if index % 10 else "processing",
+            "page_count": 5,
+            "processed_pages": 5,
+            "created_at": started + datetime.timedelta(minutes=index),
+            "updated_at": started + datetime.timedelta(minutes=index),
+        }
+        if index % 3:
+            job["first_question"] = f"Solve problem {index}."
+        firestore.write(("jobs", job_id), job)
+        firestore.write(("jobs", job_id, "results", "page_1"), {
+            "page_number": 1, "results": [{"question": f"Solve problem {index}.", "answer": "x = 2"}],
+        })
+
+
+def run_jobs(args, job_count: int) -> dict:
+    from core.firestore import firestore_service
+    env = install_fakes(args)
+    seed_jobs(env.firestore, "benchmark-user", job_count)
+    seed_jobs(env.firestore, "other-user", job_count // 2)
+    rss_before = peak_rss_mb()
+    latencies, listed = [], 0
+    calls_before = env.firestore.calls
+    started = time.monotonic()
+    for _ in range(args.repeat):
+        cursor = None
+        while True:
+            call_started = time.monotonic()
+            result = firestore_service.get_jobs_for_user("benchmark-user", page_size=args.page_size, cursor=cursor)
+            latencies.append(time.monotonic() - call_started)
+            listed += len(result.data["jobs"])
+            cursor = result.data["next_cursor"]
+            if not cursor:
+                break
+    elapsed = time.monotonic() - started
+    return {
+        "scenario": "jobs",
+        "case": f"jobs-{job_count}",
+        "calls": len(latencies),
+        "jobs_listed": listed,
+        "throughput_calls_per_s": round(len(latencies) / elapsed, 2),
+        "call": percentiles(latencies),
+        "firestore_calls": env.firestore.calls - calls_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def run_chat(args, requests: int) -> dict:
+    from modules.chat.services import ChatService
+    env = install_fakes(args)
+    seed_jobs(env.firestore, "benchmark-user", 4)
+    service = ChatService()
+    history = [
+        {"role": "user" if turn % 2 == 0 else "model", "content": f"Turn {turn}: why does step {turn} work?"}
+        for turn in range(args.chat_turns)
+    ]
+    if history[-1]["role"] != "user":
+        history.append({"role": "user", "content": "Can you explain the last step again?"})
+    lock = threading.Lock()
+    blocking, first_chunk, streamed, errors = [], [], [], []
+
+    def explain(index: int):
+        job_id = f"benchmark-user-{index % 4:06d}"
+        started = time.monotonic()
+        try:
+            question = service.load_question(job_id, 1, 0).data
+            if index % 2:
+                result = service.get_ai_explanation(question, history)
+                if not result.success:
+                    raise RuntimeError(result.message)
+                with lock:
+                    blocking.append(time.monotonic() - started)
+                return
+            prepared = service.prepare_request(question, history)
+            first = None
+            for _ in service.stream_ai_explanation(prepared.data):
+                first = first or time.monotonic() - started
+            with lock:
+                first_chunk.append(first)
+                streamed.append(time.monotonic() - started)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+
+    rss_before = peak_rss_mb()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        list(executor.map(explain, range(requests)))
+    elapsed = time.monotonic() - started
+    return {
+        "scenario": "chat",
+        "case": f"chat-{requests}",
+        "requests": requests,
+        "errors": len(errors),
+        "throughput_requests_per_s": round((requests - len(errors)) / elapsed, 2),
+        "blocking": percentiles(blocking),
+        "stream_first_chunk": percentiles(first_chunk),
+        "stream_total": percentiles(streamed),
+        "model_calls": env.genai.models.calls,
+        "context_caches_created": env.genai.caches.created,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def run_case(args, case: dict) -> dict:
+    import logging
+    logging.disable(logging.WARNING if args.verbose else logging.CRITICAL)
+    if case["scenario"] == "solve":
+        return run_solve(args, case["kind"], case["pages"])
+    if case["scenario"] == "jobs":
+        return run_jobs(args, case["jobs"])
+    return run_chat(args, case["requests"])
+
+
+def git_commit() -> dict:
+    def git(*command):
+        return subprocess.run(["git", *command], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--", "."))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def cases(args) -> list:
+    planned = []
+    if "solve" in args.scenarios:
+        planned += [{"scenario": "solve", "kind": kind, "pages": pages} for kind in args.kinds for pages in args.pages]
+    if "jobs" in args.scenarios:
+        planned += [{"scenario": "jobs", "jobs": count} for count in args.jobs]
+    if "chat" in args.scenarios:
+        planned.append({"scenario": "chat", "requests": args.chat_requests})
+    return planned
+
+
+def main():
+    from benchmarks.corpus import KINDS, PAGE_COUNTS
+    parser = argparse.ArgumentParser(
+        description="Offline benchmarks for the solve pipeline, job listing and chat against in-memory Gemini, GCS "
+                    "and Firestore stand-ins. Prints one JSON report; diff two reports with benchmarks.compare."
+    )
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--kinds", nargs="*", choices=KINDS, default=["text"])
+    parser.add_argument("--pages", type=int, nargs="*", default=list(PAGE_COUNTS))
+    parser.add_argument("--jobs", type=int, nargs="*", default=[100, 1000])
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--chat-requests", type=int, default=100)
+    parser.add_argument("--chat-turns", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent chat callers.")
+    parser.add_argument("--repeat", type=int, default=3, help="Jobs per solve case, passes per listing case.")
+    parser.add_argument("--gemini-latency", type=float, default=0.2, help="Median fake model latency in seconds.")
+    parser.add_argument("--gemini-jitter", type=float, default=0.5,
+                        help="Lognormal shape, or extra seconds for the uniform distribution.")
+    parser.add_argument("--gemini-distribution", choices=("uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--gemini-concurrency", type=int, default=64, help="Fake server-side concurrency quota.")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--firestore-latency", type=float, default=0.005, help="Seconds per fake Firestore round trip.")
+    parser.add_argument("--storage-latency", type=float, default=0.02, help="Seconds per fake GCS object call.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the report here instead of stdout.")
+    parser.add_argument("--verbose", action="store_true", help="Keep the service's warning logs.")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.case:
+        print(json.dumps(run_case(args, json.loads(args.case))))
+        return
+    results = []
+    for case in cases(args):
+        print(f"running {case}", file=sys.stderr)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", *sys.argv[1:], "--case", json.dumps(case)],
+            cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    report = {
+        **git_commit(),
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("case", "output", "verbose")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
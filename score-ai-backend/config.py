@@ -15,6 +15,73 @@ class Settings(BaseSettings):
     STORAGE_BUCKET: str = Field(..., env="STORAGE_BUCKET")
     GEMINI_API_KEY: str = Field(..., env="GEMINI_API_KEY")
     GEMINI_MODEL_NAME: str = Field("gemini-2.5-flash", env="GEMINI_MODEL_NAME")
+    GEMINI_RPM_LIMIT: int = Field(1000, env="GEMINI_RPM_LIMIT")
+    GEMINI_TPM_LIMIT: int = Field(1_000_000, env="GEMINI_TPM_LIMIT")
+    GEMINI_MAX_RETRIES: int = Field(4, env="GEMINI_MAX_RETRIES")
+    GEMINI_RETRY_BASE_SECONDS: float = Field(1.0, env="GEMINI_RETRY_BASE_SECONDS")
+    GEMINI_RETRY_MAX_SECONDS: float = Field(30.0, env="GEMINI_RETRY_MAX_SECONDS")
+    GEMINI_CALL_TIMEOUT_SECONDS: float = Field(120.0, env="GEMINI_CALL_TIMEOUT_SECONDS")
+    GEMINI_CALL_DEADLINE_SECONDS: float = Field(300.0, env="GEMINI_CALL_DEADLINE_SECONDS")
+    GEMINI_CONCURRENCY_INITIAL: int = Field(8, env="GEMINI_CONCURRENCY_INITIAL")
+    GEMINI_CONCURRENCY_MIN: int = Field(1, env="GEMINI_CONCURRENCY_MIN")
+    GEMINI_CONCURRENCY_MAX: int = Field(32, env="GEMINI_CONCURRENCY_MAX")
+    GEMINI_LATENCY_TARGET_SECONDS: float = Field(60.0, env="GEMINI_LATENCY_TARGET_SECONDS")
+    AUTH_TOKEN_CACHE_SIZE: int = Field(1024, env="AUTH_TOKEN_CACHE_SIZE")
+    AUTH_REVOCATION_RECHECK_SECONDS: int = Field(300, env="AUTH_REVOCATION_RECHECK_SECONDS")
+    HTTP_POOL_MAXSIZE: int = Field(32, env="HTTP_POOL_MAXSIZE")
+    UPLOAD_MAX_BYTES: int = Field(50 * 1024 * 1024, env="UPLOAD_MAX_BYTES")
+    UPLOAD_CHUNK_SIZE: int = Field(8 * 1024 * 1024, env="UPLOAD_CHUNK_SIZE")
+    PROCESSING_MAX_CONCURRENCY: int = Field(4, env="PROCESSING_MAX_CONCURRENCY")
+    PROCESSING_PACK_SIZE: int = Field(1, env="PROCESSING_PACK_SIZE")
+    PROCESSING_PACK_MAX_SIZE: int = Field(8, env="PROCESSING_PACK_MAX_SIZE")
+    PROCESSING_PACK_MAX_BYTES: int = Field(8 * 1024 * 1024, env="PROCESSING_PACK_MAX_BYTES")
+    PROCESSING_PACK_LATENCY_TARGET_SECONDS: float = Field(90.0, env="PROCESSING_PACK_LATENCY_TARGET_SECONDS")
+    PROCESSING_BATCH_BACKEND: str = Field("gemini", env="PROCESSING_BATCH_BACKEND")
+    PROCESSING_BATCH_POLL_SECONDS: int = Field(300, env="PROCESSING_BATCH_POLL_SECONDS")
+    PROCESSING_BATCH_MAX_INLINE_BYTES: int = Field(15 * 1024 * 1024, env="PROCESSING_BATCH_MAX_INLINE_BYTES")
+    PROCESSING_BATCH_MAX_WAIT_SECONDS: int = Field(36 * 3600, env="PROCESSING_BATCH_MAX_WAIT_SECONDS")
+    PROCESSING_HANDOFF_MAX_BYTES: int = Field(20 * 1024 * 1024, env="PROCESSING_HANDOFF_MAX_BYTES")
+    PROCESSING_HANDOFF_MAX_FILES: int = Field(16, env="PROCESSING_HANDOFF_MAX_FILES")
+    PROCESSING_HANDOFF_TTL_SECONDS: int = Field(600, env="PROCESSING_HANDOFF_TTL_SECONDS")
+    PROCESSING_PAGE_MAX_ATTEMPTS: int = Field(2, env="PROCESSING_PAGE_MAX_ATTEMPTS")
+    JOB_WRITE_FLUSH_PAGES: int = Field(10, env="JOB_WRITE_FLUSH_PAGES")
+    JOB_WRITE_FLUSH_SECONDS: float = Field(2.0, env="JOB_WRITE_FLUSH_SECONDS")
+    JOB_QUEUE_BACKEND: str = Field("firestore", env="JOB_QUEUE_BACKEND")
+    JOB_QUEUE_COLLECTION: str = Field("job_queue", env="JOB_QUEUE_COLLECTION")
+    JOB_QUEUE_LEASE_SECONDS: int = Field(120, env="JOB_QUEUE_LEASE_SECONDS")
+    JOB_QUEUE_HEARTBEAT_SECONDS: int = Field(30, env="JOB_QUEUE_HEARTBEAT_SECONDS")
+    JOB_QUEUE_MAX_ATTEMPTS: int = Field(3, env="JOB_QUEUE_MAX_ATTEMPTS")
+    JOB_QUEUE_RETRY_BASE_SECONDS: int = Field(15, env="JOB_QUEUE_RETRY_BASE_SECONDS")
+    JOB_QUEUE_LOCAL_WORKERS: int = Field(2, env="JOB_QUEUE_LOCAL_WORKERS")
+    JOB_EVENTS_KEEPALIVE_SECONDS: int = Field(15, env="JOB_EVENTS_KEEPALIVE_SECONDS")
+    JOB_EVENTS_MAX_SECONDS: int = Field(300, env="JOB_EVENTS_MAX_SECONDS")
+    CHAT_HISTORY_WINDOW: int = Field(12, env="CHAT_HISTORY_WINDOW")
+    CHAT_HISTORY_SUMMARY_MAX_CHARS: int = Field(2000, env="CHAT_HISTORY_SUMMARY_MAX_CHARS")
+    CHAT_QUESTION_CACHE_MAX_ENTRIES: int = Field(256, env="CHAT_QUESTION_CACHE_MAX_ENTRIES")
+    CHAT_QUESTION_CACHE_TTL_SECONDS: int = Field(600, env="CHAT_QUESTION_CACHE_TTL_SECONDS")
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = Field(True, env="GEMINI_CONTEXT_CACHE_ENABLED")
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = Field(3600, env="GEMINI_CONTEXT_CACHE_TTL_SECONDS")
+    GEMINI_CONTEXT_CACHE_MIN_CHARS: int = Field(4096, env="GEMINI_CONTEXT_CACHE_MIN_CHARS")
+    PAGE_CACHE_BACKEND: str = Field("memory", env="PAGE_CACHE_BACKEND")
+    PAGE_CACHE_MAX_ENTRIES: int = Field(1024, env="PAGE_CACHE_MAX_ENTRIES")
+    PAGE_CACHE_TTL_SECONDS: int = Field(7 * 24 * 3600, env="PAGE_CACHE_TTL_SECONDS")
+    PAGE_CACHE_COLLECTION: str = Field("page_cache", env="PAGE_CACHE_COLLECTION")
+    PAGE_FILTER_ENABLED: bool = Field(True, env="PAGE_FILTER_ENABLED")
+    PAGE_FILTER_BLANK_INK: float = Field(0.0001, env="PAGE_FILTER_BLANK_INK")
+    PAGE_FILTER_BLANK_STDDEV: float = Field(1.5, env="PAGE_FILTER_BLANK_STDDEV")
+    PAGE_FILTER_SPARSE_MAX_CHARS: int = Field(60, env="PAGE_FILTER_SPARSE_MAX_CHARS")
+    PAGE_FILTER_SPARSE_INK: float = Field(0.02, env="PAGE_FILTER_SPARSE_INK")
+    PAGE_FILTER_TITLE_FONT_SIZE: float = Field(18.0, env="PAGE_FILTER_TITLE_FONT_SIZE")
+    PAGE_FILTER_DUPLICATE_DISTANCE: int = Field(3, env="PAGE_FILTER_DUPLICATE_DISTANCE")
+    PAGE_TEXT_ENABLED: bool = Field(True, env="PAGE_TEXT_ENABLED")
+    PAGE_TEXT_MIN_CHARS: int = Field(80, env="PAGE_TEXT_MIN_CHARS")
+    PAGE_TEXT_MAX_IMAGE_COVERAGE: float = Field(0.3, env="PAGE_TEXT_MAX_IMAGE_COVERAGE")
+    PAGE_TEXT_MAX_CROPS: int = Field(6, env="PAGE_TEXT_MAX_CROPS")
+    PAGE_IMAGE_ENABLED: bool = Field(True, env="PAGE_IMAGE_ENABLED")
+    PAGE_IMAGE_DPI: int = Field(150, env="PAGE_IMAGE_DPI")
+    PAGE_IMAGE_MAX_PIXELS: int = Field(2_500_000, env="PAGE_IMAGE_MAX_PIXELS")
+    PAGE_IMAGE_FORMAT: str = Field("JPEG", env="PAGE_IMAGE_FORMAT")
+    PAGE_IMAGE_QUALITY: int = Field(80, env="PAGE_IMAGE_QUALITY")
     
     PROMPTS_CONFIG: Dict[str, str] = {
         "math_problem": """
@@ -39,6 +106,14 @@ class Settings(BaseSettings):
         ### Format
         Use only markdown format to write the response. Don't even use html tags or latex symbols.
         """,
+        "page_text": """
+        The page's text layer has been extracted for you below, in reading order. Regions that text cannot represent well, such as equations, figures and embedded images, follow as cropped images. Use both together as the page.
+        """,
+        "page_packing": """
+        The document pages follow, each introduced by a label such as "Page 3". Treat every page separately.
+        For every question you return, set page_number to the number from the label of the page the question appears on.
+        Pages with no questions simply contribute no entries.
+        """,
         "chat_context": """You are an AI assistant. A user is asking for help with the following math problem from a document. Your task is to answer their questions about it.
 
         Here is the problem context:
@@ -0,0 +1,86 @@
+import datetime
+import logging
+import threading
+from typing import Any, Optional
+from cachetools import TTLCache
+class MemoryCache:
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._cache.get(key)
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._cache[key] = value
+class FirestoreCache:
+    def __init__(self, collection: str, ttl_seconds: int):
+        self.collection = collection
+        self.ttl = datetime.timedelta(seconds=ttl_seconds)
+    def _document(self, key: str):
+        from core.firestore import firestore_service
+        return firestore_service.db.collection(self.collection).document(key)
+    def get(self, key: str) -> Optional[Any]:
+        doc = self._document(key).get()
+        if not doc.exists:
+            return None
+        entry = doc.to_dict()
+        if entry.get('expires_at') and entry['expires_at'] <= datetime.datetime.now(datetime.timezone.utc):
+            return None
+        return entry.get('value')
+    def set(self, key: str, value: Any):
+        self._document(key).set({
+            'value': value,
+            'expires_at': datetime.datetime.now(datetime.timezone.utc) + self.ttl,
+        })
+class TieredCache:
+    def __init__(self, *tiers):
+        self.tiers = tiers
+    def get(self, key: str) -> Optional[Any]:
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for upper_tier in self.tiers[:i]:
+                    upper_tier.set(key, value)
+                return value
+        return None
+    def set(self, key: str, value: Any):
+        for tier in self.tiers:
+            tier.set(key, value)
+class ResultCache:
+    def __init__(self, backend, name: str):
+        self.backend = backend
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logging.warning(f"Error reading {self.name} cache entry {key}: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+    def set(self, key: str, value: Any):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logging.warning(f"Error writing {self.name} cache entry {key}: {e}")
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+def build_result_cache(name: str, backend: str, max_entries: int, ttl_seconds: int, collection: str) -> Optional[ResultCache]:
+    if backend == 'memory':
+        return ResultCache(MemoryCache(max_entries, ttl_seconds), name)
+    if backend == 'firestore':
+        return ResultCache(FirestoreCache(collection, ttl_seconds), name)
+    if backend == 'tiered':
+        return ResultCache(TieredCache(MemoryCache(max_entries, ttl_seconds), FirestoreCache(collection, ttl_seconds)), name)
+    if backend != 'none':
+        logging.warning(f"Unknown {name} cache backend '{backend}', caching disabled.")
+    return None
@@ -0,0 +1,62 @@
+import threading
+from config import settings
+_clients = {}
+_lock = threading.RLock()
+def _get_or_create(name: str, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+def set_client(name: str, client):
+    with _lock:
+        _clients[name] = client
+def reset_clients():
+    with _lock:
+        _clients.clear()
+def _create_credentials():
+    import google.auth
+    credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    return credentials
+def get_credentials():
+    return _get_or_create('credentials', _create_credentials)
+def _create_http_session():
+    import requests
+    from google.auth.transport.requests import AuthorizedSession
+    session = AuthorizedSession(get_credentials())
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=settings.HTTP_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    return session
+def get_http_session():
+    return _get_or_create('http_session', _create_http_session)
+def _create_storage_client():
+    from google.cloud import storage
+    return storage.Client(project=settings.PROJECT_ID, credentials=get_credentials(), _http=get_http_session())
+def get_storage_client():
+    return _get_or_create('storage', _create_storage_client)
+def get_bucket():
+    return _get_or_create('bucket', lambda: get_storage_client().bucket(settings.STORAGE_BUCKET))
+def _create_firestore_client():
+    from google.cloud import firestore
+    return firestore.Client(project=settings.PROJECT_ID, database=settings.FIRESTORE_DB)
+def get_firestore_client():
+    return _get_or_create('firestore', _create_firestore_client)
+def _create_genai_client():
+    from google import genai
+    return genai.Client(api_key=settings.GEMINI_API_KEY)
+def get_genai_client():
+    return _get_or_create('genai', _create_genai_client)
+def _initialize_firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        return firebase_admin.initialize_app(credentials.ApplicationDefault(), {
+            'projectId': settings.PROJECT_ID,
+        })
+def get_firebase_app():
+    return _get_or_create('firebase_app', _initialize_firebase_app)
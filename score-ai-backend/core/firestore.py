@@ -1,19 +1,26 @@
+import base64
+import datetime
+import json
 import logging
+import threading
+from collections import Counter
 from google.cloud import firestore
 from config import settings
+from core.clients import get_firestore_client
+from core.metrics import timed
 from core.schemas import ServiceResult
+JOB_LIST_FIELDS = ['status', 'file_gcs_path', 'page_count', 'processed_pages', 'first_question', 'created_at', 'updated_at']
 class FirestoreService:
-    def __init__(self):
-        self.db = firestore.Client(
-            project=settings.PROJECT_ID,
-            database=settings.FIRESTORE_DB
-        )
-    def create_job(self, user_id: str, file_gcs_path: str) -> ServiceResult:
+    @property
+    def db(self):
+        return get_firestore_client()
+    def create_job(self, user_id: str, file_gcs_path: str, mode: str = 'interactive') -> ServiceResult:
         try:
             job_ref = self.db.collection('jobs').document()
             job_data = {
                 'user_id': user_id,
                 'file_gcs_path': file_gcs_path,
+                'mode': mode,
                 'status': 'processing',
                 'page_count': 0,
                 'processed_pages': 0,
@@ -68,91 +75,293 @@ class FirestoreService:
         except Exception as e:
             logging.error(f"Error deleting Firestore job {job_id}: {e}")
             return ServiceResult.failure_result(message=str(e), status_code=500)
-    def delete_all_jobs_for_user(self, user_id: str) -> ServiceResult:
+    def get_job_refs_for_user(self, user_id: str) -> ServiceResult:
         try:
-            jobs_query = self.db.collection('jobs').where('user_id', '==', user_id)
-            jobs_docs = jobs_query.stream()
-            deleted_count = 0
-            for job_doc in jobs_docs:
-                job_id = job_doc.id
-                delete_result = self.delete_job(job_id)
-                if delete_result.success:
-                    deleted_count += 1
+            query = self.db.collection('jobs').where('user_id', '==', user_id).select(['file_gcs_path', 'page_count'])
+            jobs = []
+            for doc in query.stream():
+                job_data = doc.to_dict()
+                job_data['id'] = doc.id
+                jobs.append(job_data)
+            return ServiceResult.success_result(data=jobs)
+        except Exception as e:
+            logging.error(f"Error listing jobs for user {user_id}: {e}")
+            return ServiceResult.failure_result(message=str(e), status_code=500)
+    def delete_jobs(self, jobs: list, on_progress=None) -> ServiceResult:
+        try:
+            progress = {'deleted_count': 0}
+            progress_lock = threading.Lock()
+            def on_write_result(reference, result, bulk_writer):
+                if reference.parent.id != 'jobs':
+                    return
+                with progress_lock:
+                    progress['deleted_count'] += 1
+                    deleted_count = progress['deleted_count']
+                if on_progress:
+                    on_progress(deleted_count)
+            bulk_writer = self.db.bulk_writer()
+            bulk_writer.on_write_result(on_write_result)
+            for job in jobs:
+                job_ref = self.db.collection('jobs').document(job['id'])
+                results_ref = job_ref.collection('results')
+                page_count = job.get('page_count') or 0
+                if page_count:
+                    result_refs = [results_ref.document(f'page_{n}') for n in range(1, page_count + 1)]
                 else:
-                    logging.warning(f"Failed to delete job {job_id}: {delete_result.message}")
-            logging.info(f"Deleted {deleted_count} jobs for user {user_id}")
-            return ServiceResult.success_result(data={'deleted_count': deleted_count})
+                    result_refs = results_ref.list_documents()
+                for result_ref in result_refs:
+                    bulk_writer.delete(result_ref)
+                bulk_writer.delete(job_ref)
+            bulk_writer.close()
+            logging.info(f"Bulk deleted {progress['deleted_count']} of {len(jobs)} Firestore jobs and their results")
+            return ServiceResult.success_result(data={'deleted_count': progress['deleted_count']})
         except Exception as e:
-            logging.error(f"Error deleting all jobs for user {user_id}: {e}")
+            logging.error(f"Error bulk deleting Firestore jobs: {e}")
             return ServiceResult.failure_result(message=str(e), status_code=500)
-    def add_page_result(self, job_id: str, page_number: int, results: list) -> ServiceResult:
+    def create_deletion(self, user_id: str, total_jobs: int = None) -> ServiceResult:
         try:
-            page_ref = self.db.collection('jobs').document(job_id).collection('results').document(f'page_{page_number}')
-            page_ref.set({
-                'page_number': page_number,
-                'results': results,
-                'created_at': firestore.SERVER_TIMESTAMP
+            deletion_ref = self.db.collection('deletions').document()
+            deletion_ref.set({
+                'user_id': user_id,
+                'status': 'running',
+                'total_jobs': total_jobs,
+                'deleted_jobs': 0,
+                'deleted_files': 0,
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'updated_at': firestore.SERVER_TIMESTAMP,
             })
-            job_ref = self.db.collection('jobs').document(job_id)
-            job_ref.update({'processed_pages': firestore.Increment(1)})
+            return ServiceResult.success_result(data={'deletion_id': deletion_ref.id}, status_code=202)
+        except Exception as e:
+            logging.error(f"Error creating deletion for user {user_id}: {e}")
+            return ServiceResult.failure_result(message=str(e), status_code=500)
+    def get_deletion(self, deletion_id: str) -> ServiceResult:
+        try:
+            deletion = self.db.collection('deletions').document(deletion_id).get()
+            if deletion.exists:
+                return ServiceResult.success_result(data=deletion.to_dict())
+            return ServiceResult.failure_result(message="Deletion not found", status_code=404)
+        except Exception as e:
+            logging.error(f"Error getting deletion {deletion_id}: {e}")
+            return ServiceResult.failure_result(message=str(e), status_code=500)
+    def update_deletion(self, deletion_id: str, data: dict) -> ServiceResult:
+        try:
+            data['updated_at'] = firestore.SERVER_TIMESTAMP
+            self.db.collection('deletions').document(deletion_id).update(data)
             return ServiceResult.success_result()
         except Exception as e:
-            logging.error(f"Error adding page result for job {job_id}: {e}")
+            logging.error(f"Error updating deletion {deletion_id}: {e}")
+            return ServiceResult.failure_result(message=str(e), status_code=500)
+    @staticmethod
+    def _first_question(results: list):
+        if results and results[0].get('question'):
+            return results[0]['question']
+        return None
+    def job_writer(self, job_id: str, flush_pages: int = None, flush_seconds: float = None, job: dict = None,
+                   track_first_question: bool = True) -> 'JobWriteCoalescer':
+        return JobWriteCoalescer(
+            self, job_id,
+            flush_pages=settings.JOB_WRITE_FLUSH_PAGES if flush_pages is None else flush_pages,
+            flush_seconds=settings.JOB_WRITE_FLUSH_SECONDS if flush_seconds is None else flush_seconds,
+            job=job, track_first_question=track_first_question,
+        )
+    def add_page_result(self, job_id: str, page_number: int, results: list, **fields) -> ServiceResult:
+        writer = self.job_writer(job_id, flush_pages=1, flush_seconds=0, track_first_question=False)
+        writer.add_page_result(page_number, results, **fields)
+        return writer.close()
+    def get_page_result(self, job_id: str, page_number: int) -> ServiceResult:
+        try:
+            page = self.db.collection('jobs').document(job_id).collection('results').document(f'page_{page_number}').get()
+            if page.exists:
+                return ServiceResult.success_result(data=page.to_dict())
+            return ServiceResult.failure_result(message="Page not found", status_code=404)
+        except Exception as e:
+            logging.error(f"Error getting page {page_number} of job {job_id}: {e}")
             return ServiceResult.failure_result(message=str(e), status_code=500)
-    def get_job_results_paginated(self, job_id: str, page_size: int, cursor: str = None) -> ServiceResult:
+    def job_results_query(self, job_id: str, since: datetime.datetime = None):
+        query = self.db.collection('jobs').document(job_id).collection('results')
+        if since:
+            query = query.where('created_at', '>=', since)
+        return query.order_by('created_at')
+    def watch_job(self, job_id: str, since: datetime.datetime, on_job, on_results):
+        job_watch = self.db.collection('jobs').document(job_id).on_snapshot(on_job)
+        results_watch = self.job_results_query(job_id, since).on_snapshot(on_results)
+        watches = [job_watch, results_watch]
+        def unsubscribe():
+            while watches:
+                watches.pop().unsubscribe()
+        return unsubscribe
+    def get_processed_page_numbers(self, job_id: str) -> set:
+        results_ref = self.db.collection('jobs').document(job_id).collection('results')
+        return {int(ref.id[len('page_'):]) for ref in results_ref.list_documents() if ref.id.startswith('page_')}
+    @staticmethod
+    def decode_results_cursor(cursor: str) -> int:
+        return int(cursor[len('page_'):] if cursor.startswith('page_') else cursor)
+    def get_job_results_paginated(self, job_id: str, page_size: int = None, cursor: str = None) -> ServiceResult:
         try:
-            query = self.db.collection('jobs').document(job_id).collection('results').order_by('page_number').limit(page_size)
+            query = self.db.collection('jobs').document(job_id).collection('results').order_by('page_number')
+            if page_size:
+                query = query.limit(page_size)
             if cursor:
-                cursor_snapshot = self.db.collection('jobs').document(job_id).collection('results').document(cursor).get()
-                if not cursor_snapshot.exists:
+                try:
+                    query = query.start_after({'page_number': self.decode_results_cursor(cursor)})
+                except ValueError:
                     return ServiceResult.failure_result("Invalid cursor", 400)
-                query = query.start_after(cursor_snapshot)
-            docs = list(query.stream())
-            results = [doc.to_dict() for doc in docs]
+            results = [doc.to_dict() for doc in query.stream()]
             next_cursor = None
-            if len(docs) == page_size:
-                next_cursor = docs[-1].id
+            if page_size and len(results) == page_size:
+                next_cursor = str(results[-1]['page_number'])
             return ServiceResult.success_result(data={'results': results, 'next_cursor': next_cursor})
         except Exception as e:
             logging.error(f"Error getting paginated results for job {job_id}: {e}")
             return ServiceResult.failure_result(message=str(e), status_code=500)
-    def get_jobs_for_user(self, user_id: str) -> ServiceResult:
+    @staticmethod
+    def encode_jobs_cursor(job: dict) -> str:
+        cursor = {'created_at': job['created_at'].isoformat(), 'id': job['id']}
+        return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+    @staticmethod
+    def decode_jobs_cursor(cursor: str) -> dict:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return {'created_at': datetime.datetime.fromisoformat(data['created_at']), '__name__': data['id']}
+    def get_jobs_for_user(self, user_id: str, page_size: int = None, cursor: str = None, status: str = None) -> ServiceResult:
         try:
-            query = self.db.collection('jobs').where('user_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
+            query = self.db.collection('jobs').where('user_id', '==', user_id)
+            if status:
+                query = query.where('status', '==', status)
+            query = query.select(JOB_LIST_FIELDS).order_by('created_at', direction=firestore.Query.DESCENDING).order_by('__name__', direction=firestore.Query.DESCENDING)
+            if cursor:
+                try:
+                    query = query.start_after(self.decode_jobs_cursor(cursor))
+                except (ValueError, KeyError, TypeError):
+                    return ServiceResult.failure_result("Invalid cursor", 400)
+            if page_size:
+                query = query.limit(page_size)
             docs = query.stream()
             jobs = []
-            completed_job_ids = []
+            jobs_by_id = {}
             for doc in docs:
                 job_data = doc.to_dict()
                 job_data['id'] = doc.id
                 jobs.append(job_data)
-                if job_data.get('status') == 'completed':
-                    completed_job_ids.append(doc.id)
-            if completed_job_ids:
-                limited_job_ids = completed_job_ids[:20]
-                batch_size = 10  
-                for i in range(0, len(limited_job_ids), batch_size):
-                    batch_job_ids = limited_job_ids[i:i + batch_size]
-                    for job_id in batch_job_ids:
-                        try:
-                            first_page_ref = self.db.collection('jobs').document(job_id).collection('results').document('page_1')
-                            first_page_doc = first_page_ref.get()
-                            if first_page_doc.exists:
-                                page_data = first_page_doc.to_dict()
-                                if page_data and 'results' in page_data:
-                                    qa_pairs = page_data['results']
-                                    if qa_pairs and len(qa_pairs) > 0:
-                                        first_qa = qa_pairs[0]
-                                        if 'question' in first_qa and first_qa['question']:
-                                            for job in jobs:
-                                                if job['id'] == job_id:
-                                                    job['first_question'] = first_qa['question']
-                                                    break
-                        except Exception as e:
-                            logging.warning(f"Error fetching first question for job {job_id}: {e}")
+                jobs_by_id[doc.id] = job_data
+            first_page_refs = [
+                self.db.collection('jobs').document(job['id']).collection('results').document('page_1')
+                for job in jobs
+                if job.get('status') == 'completed' and 'first_question' not in job
+            ]
+            if first_page_refs:
+                try:
+                    for first_page_doc in self.db.get_all(first_page_refs, field_paths=['results']):
+                        if not first_page_doc.exists:
                             continue
-            return ServiceResult.success_result(data=jobs)
+                        first_question = self._first_question(first_page_doc.to_dict().get('results'))
+                        if first_question:
+                            jobs_by_id[first_page_doc.reference.parent.parent.id]['first_question'] = first_question
+                except Exception as e:
+                    logging.warning(f"Error fetching first questions for user {user_id}: {e}")
+            next_cursor = None
+            if page_size and len(jobs) == page_size and jobs[-1].get('created_at'):
+                next_cursor = self.encode_jobs_cursor(jobs[-1])
+            return ServiceResult.success_result(data={'jobs': jobs, 'next_cursor': next_cursor})
         except Exception as e:
             logging.error(f"Error getting jobs for user {user_id}: {e}")
             return ServiceResult.failure_result(message=str(e), status_code=500)
+class JobWriteCoalescer:
+    MAX_PAGES_PER_BATCH = 400
+    def __init__(self, service: FirestoreService, job_id: str, flush_pages: int, flush_seconds: float,
+                 job: dict = None, track_first_question: bool = True):
+        self.service = service
+        self.job_id = job_id
+        self.job = job
+        self.track_first_question = track_first_question
+        self.flush_pages = max(1, min(flush_pages, self.MAX_PAGES_PER_BATCH))
+        self.flush_seconds = flush_seconds
+        self.pages = {}
+        self.job_update = {}
+        self.first_question = None
+        self.flushes = 0
+        self.writes = 0
+        self._timer = None
+        self._lock = threading.Lock()
+    def add_page_result(self, page_number: int, results: list, **fields):
+        with self._lock:
+            self.pages[page_number] = {**fields, 'results': results}
+            question = self.service._first_question(results)
+            if question and (self.first_question is None or page_number < self.first_question[0]):
+                self.first_question = (page_number, question)
+            due = len(self.pages) >= self.flush_pages
+            if not due:
+                self._start_timer()
+        if due:
+            self.flush()
+    def update_job(self, data: dict):
+        with self._lock:
+            self.job_update.update(data)
+            self._start_timer()
+    def _start_timer(self):
+        if self._timer is None and self.flush_seconds > 0:
+            self._timer = threading.Timer(self.flush_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+    def flush(self) -> ServiceResult:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.pages and not self.job_update:
+                return ServiceResult.success_result()
+            pages, self.pages = self.pages, {}
+            job_update, self.job_update = self.job_update, {}
+            try:
+                job_ref = self.service.db.collection('jobs').document(self.job_id)
+                batch = self.service.db.batch()
+                for page_number, page in pages.items():
+                    batch.set(job_ref.collection('results').document(f'page_{page_number}'), {
+                        **page,
+                        'page_number': page_number,
+                        'created_at': firestore.SERVER_TIMESTAMP
+                    })
+                update = dict(job_update)
+                if pages:
+                    update['processed_pages'] = firestore.Increment(len(pages))
+                for reason, count in Counter(page['skip_reason'] for page in pages.values() if page.get('skip_reason')).items():
+                    update[f'skipped_pages.{reason}'] = firestore.Increment(count)
+                for kind, count in sum((Counter(page.get('tokens') or {}) for page in pages.values()), Counter()).items():
+                    update[f'token_usage.{kind}'] = firestore.Increment(count)
+                update['updated_at'] = firestore.SERVER_TIMESTAMP
+                batch.update(job_ref, update)
+                with timed('firestore_write'):
+                    batch.commit()
+                self.flushes += 1
+                self.writes += len(pages) + 1
+                return ServiceResult.success_result()
+            except Exception as e:
+                logging.error(f"Error flushing {len(pages)} page results for job {self.job_id}: {e}")
+                self.pages = {**pages, **self.pages}
+                self.job_update = {**job_update, **self.job_update}
+                return ServiceResult.failure_result(message=str(e), status_code=500)
+    def _first_question_update(self, completing: bool) -> dict:
+        if not self.track_first_question or (self.first_question is None and not completing):
+            return {}
+        if self.job is not None:
+            current_page = self.job.get('first_question_page')
+        else:
+            try:
+                job = self.service.db.collection('jobs').document(self.job_id).get(field_paths=['first_question_page'])
+                current_page = (job.to_dict() or {}).get('first_question_page') if job.exists else None
+            except Exception as e:
+                logging.warning(f"Error reading first question of job {self.job_id}: {e}")
+                return {}
+        if self.first_question and (current_page is None or self.first_question[0] < current_page):
+            page_number, question = self.first_question
+            return {'first_question': question, 'first_question_page': page_number}
+        if completing and current_page is None:
+            return {'first_question': None}
+        return {}
+    def close(self, job_update: dict = None) -> ServiceResult:
+        first_question = self._first_question_update(completing=(job_update or {}).get('status') == 'completed')
+        with self._lock:
+            self.job_update.update({**(job_update or {}), **first_question})
+        result = self.flush()
+        logging.info(f"Job {self.job_id} results written in {self.flushes} batches ({self.writes} writes)")
+        return result
 firestore_service = FirestoreService()
\ No newline at end of file
@@ -0,0 +1,209 @@
+import logging
+import random
+import threading
+import time
+from typing import Optional
+from config import settings
+from core.metrics import record_usage
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+class DeadlineExceeded(Exception):
+    pass
+def error_status_code(error: Exception) -> Optional[int]:
+    for attribute in ('code', 'status_code'):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status_code = error_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in ('ReadTimeout', 'ConnectTimeout', 'WriteTimeout', 'PoolTimeout', 'RemoteProtocolError', 'ConnectError')
+def backoff_seconds(attempt: int, base: float, cap: float) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+def estimate_tokens(contents) -> int:
+    if isinstance(contents, (str, bytes, dict)) or not hasattr(contents, '__iter__'):
+        contents = [contents]
+    tokens = 0
+    for item in contents:
+        if isinstance(item, str):
+            tokens += len(item) // 4 + 1
+        elif isinstance(item, dict) or getattr(item, 'inline_data', None) is not None:
+            tokens += 258
+        elif getattr(item, 'parts', None):
+            tokens += estimate_tokens(item.parts)
+        elif getattr(item, 'text', None):
+            tokens += len(item.text) // 4 + 1
+        else:
+            tokens += 258
+    return tokens
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float = None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    def acquire(self, amount: float, deadline: float = None):
+        if not self.enabled:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_seconds = (amount - self.tokens) / self.rate
+            if deadline is not None and self.clock() + wait_seconds > deadline:
+                raise DeadlineExceeded("Rate limit wait would exceed the call deadline")
+            time.sleep(min(wait_seconds, 1.0))
+    def adjust(self, amount: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+class AdaptiveConcurrencyLimiter:
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._condition = threading.Condition()
+    def acquire(self, deadline: float = None):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    raise DeadlineExceeded("Timed out waiting for a Gemini concurrency slot")
+                self._condition.wait(timeout)
+            self.in_flight += 1
+    def release(self, latency: float = None, overloaded: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded or (latency is not None and self.latency_target and latency > self.latency_target):
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+class GeminiGovernor:
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_retries: int, retry_base_seconds: float,
+                 retry_max_seconds: float, call_timeout_seconds: float, deadline_seconds: float,
+                 concurrency: AdaptiveConcurrencyLimiter):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.call_timeout_seconds = call_timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.concurrency = concurrency
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'failures': 0}
+        self._stats_lock = threading.Lock()
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            return {**self.stats, 'concurrency_limit': round(self.concurrency.limit, 2), 'in_flight': self.concurrency.in_flight}
+    def _with_timeout(self, config, remaining: float):
+        timeout_ms = int(max(1.0, min(self.call_timeout_seconds, remaining)) * 1000)
+        if config is None:
+            return {'http_options': {'timeout': timeout_ms}}
+        if isinstance(config, dict):
+            return {**config, 'http_options': {**(config.get('http_options') or {}), 'timeout': timeout_ms}}
+        from google.genai import types
+        http_options = config.http_options.model_copy(update={'timeout': timeout_ms}) if config.http_options else types.HttpOptions(timeout=timeout_ms)
+        return config.model_copy(update={'http_options': http_options})
+    def _call(self, call, estimated_tokens: int, kwargs: dict):
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            self.requests.acquire(1, deadline)
+            self.tokens.acquire(estimated_tokens, deadline)
+            self.concurrency.acquire(deadline)
+            started = time.monotonic()
+            try:
+                self._count('calls')
+                result = call({**kwargs, 'config': self._with_timeout(kwargs.get('config'), deadline - started)})
+            except Exception as e:
+                retryable = is_retryable(e)
+                throttled = error_status_code(e) == 429
+                self.concurrency.release(overloaded=retryable)
+                if throttled:
+                    self._count('throttled')
+                delay = backoff_seconds(attempt, self.retry_base_seconds, self.retry_max_seconds)
+                if not retryable or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                logging.warning(f"Gemini call failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.concurrency.release(latency=time.monotonic() - started)
+            return result
+    def generate_content(self, client, estimated_tokens: int = None, **kwargs):
+        estimated_tokens = estimated_tokens or estimate_tokens(kwargs.get('contents'))
+        response = self._call(lambda call_kwargs: client.models.generate_content(**call_kwargs), estimated_tokens, kwargs)
+        usage = getattr(response, 'usage_metadata', None)
+        record_usage(usage)
+        total_tokens = getattr(usage, 'total_token_count', None)
+        if isinstance(total_tokens, int):
+            self.tokens.adjust(total_tokens - estimated_tokens)
+        return response
+    def generate_content_stream(self, client, estimated_tokens: int = None, **kwargs):
+        estimated_tokens = estimated_tokens or estimate_tokens(kwargs.get('contents'))
+        def open_stream(call_kwargs):
+            stream = iter(client.models.generate_content_stream(**call_kwargs))
+            try:
+                first_chunk = next(stream)
+            except StopIteration:
+                first_chunk = None
+            return stream, first_chunk
+        stream, first_chunk = self._call(open_stream, estimated_tokens, kwargs)
+        last_chunk = first_chunk
+        try:
+            if first_chunk is not None:
+                yield first_chunk
+            for chunk in stream:
+                last_chunk = chunk
+                yield chunk
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+            usage = getattr(last_chunk, 'usage_metadata', None)
+            record_usage(usage)
+            total_tokens = getattr(usage, 'total_token_count', None)
+            if isinstance(total_tokens, int):
+                self.tokens.adjust(total_tokens - estimated_tokens)
+def build_governor() -> GeminiGovernor:
+    return GeminiGovernor(
+        requests_per_minute=settings.GEMINI_RPM_LIMIT,
+        tokens_per_minute=settings.GEMINI_TPM_LIMIT,
+        max_retries=settings.GEMINI_MAX_RETRIES,
+        retry_base_seconds=settings.GEMINI_RETRY_BASE_SECONDS,
+        retry_max_seconds=settings.GEMINI_RETRY_MAX_SECONDS,
+        call_timeout_seconds=settings.GEMINI_CALL_TIMEOUT_SECONDS,
+        deadline_seconds=settings.GEMINI_CALL_DEADLINE_SECONDS,
+        concurrency=AdaptiveConcurrencyLimiter(
+            initial=settings.GEMINI_CONCURRENCY_INITIAL,
+            minimum=settings.GEMINI_CONCURRENCY_MIN,
+            maximum=settings.GEMINI_CONCURRENCY_MAX,
+            latency_target=settings.GEMINI_LATENCY_TARGET_SECONDS,
+        ),
+    )
+gemini_governor = build_governor()
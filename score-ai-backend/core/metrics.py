@@ -0,0 +1,104 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+USAGE_FIELDS = {'prompt': 'prompt_token_count', 'output': 'candidates_token_count', 'total': 'total_token_count'}
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+class Counter:
+    type = 'counter'
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    def samples(self) -> list:
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(self.values.items())]
+class Histogram:
+    type = 'histogram'
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self._lock = threading.Lock()
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    samples.append((f'{self.name}_bucket', {**labels, 'le': _format_value(bound)}, cumulative))
+                samples.append((f'{self.name}_sum', labels, total))
+                samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+    def _register(self, metric):
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram('score_ai_stage_duration_seconds', 'Time spent in each pipeline stage.', ('stage',))
+STAGE_ERRORS = metrics.counter('score_ai_stage_errors_total', 'Pipeline stages that raised.', ('stage',))
+GEMINI_TOKENS = metrics.counter('score_ai_gemini_tokens_total', 'Tokens reported in Gemini usage_metadata.', ('kind',))
+PAGE_TOKENS = metrics.histogram('score_ai_page_tokens', 'Gemini tokens spent per processed page.', buckets=TOKEN_BUCKETS)
+JOB_TOKENS = metrics.histogram('score_ai_job_tokens', 'Gemini tokens spent per solve job.', buckets=TOKEN_BUCKETS)
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+def usage_tokens(usage) -> dict:
+    return {kind: getattr(usage, field, None) or 0 for kind, field in USAGE_FIELDS.items()}
+def record_usage(usage) -> dict:
+    tokens = usage_tokens(usage)
+    for kind, count in tokens.items():
+        if count:
+            GEMINI_TOKENS.inc(count, kind=kind)
+    return tokens
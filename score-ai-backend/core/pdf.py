@@ -0,0 +1,24 @@
+import threading
+from typing import Iterator
+import fitz
+from core.metrics import timed
+# PyMuPDF is not thread-safe: every fitz call in the process runs under this lock.
+fitz_lock = threading.RLock()
+def open_pdf(file_bytes: bytes) -> fitz.Document:
+    with fitz_lock:
+        return fitz.open(stream=file_bytes, filetype="pdf")
+def iter_pdf_pages(pdf_document: fitz.Document) -> Iterator[bytes]:
+    try:
+        for page_num in range(len(pdf_document)):
+            with timed('pdf_split'), fitz_lock:
+                single_page_pdf = fitz.open()
+                try:
+                    single_page_pdf.insert_pdf(pdf_document, from_page=page_num, to_page=page_num)
+                    page_bytes = single_page_pdf.tobytes(no_new_id=True)
+                finally:
+                    single_page_pdf.close()
+            yield page_bytes
+            del page_bytes
+    finally:
+        with fitz_lock:
+            pdf_document.close()
@@ -0,0 +1,262 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+from google.cloud import firestore
+from config import settings
+from core.firestore import firestore_service
+from core.schemas import ServiceResult
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+def retry_delay_seconds(attempts: int) -> int:
+    return min(300, settings.JOB_QUEUE_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+@dataclass
+class QueueTask:
+    task_id: str
+    kind: str
+    payload: dict
+    attempts: int
+    lease_id: str
+    @property
+    def is_final_attempt(self) -> bool:
+        return self.attempts >= settings.JOB_QUEUE_MAX_ATTEMPTS
+class BaseJobQueue:
+    runs_in_process = False
+    def __init__(self):
+        self.handlers: Dict[str, Callable[[QueueTask], ServiceResult]] = {}
+    def register_handler(self, kind: str, handler: Callable[[QueueTask], ServiceResult]):
+        self.handlers[kind] = handler
+    def dispatch_due(self, max_tasks: int) -> int:
+        return 0
+class FirestoreJobQueue(BaseJobQueue):
+    def __init__(self, collection: str):
+        super().__init__()
+        self.collection = collection
+    def _tasks(self):
+        return firestore_service.db.collection(self.collection)
+    def enqueue(self, kind: str, payload: dict, delay_seconds: int = 0) -> ServiceResult:
+        try:
+            task_ref = self._tasks().document()
+            task_ref.set({
+                'kind': kind,
+                'payload': payload,
+                'status': 'pending',
+                'attempts': 0,
+                'available_at': _now() + datetime.timedelta(seconds=delay_seconds),
+                'lease_id': None,
+                'worker_id': None,
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            })
+            logging.info(f"Enqueued {kind} task {task_ref.id}")
+            return ServiceResult.success_result(data={'task_id': task_ref.id}, status_code=201)
+        except Exception as e:
+            logging.error(f"Error enqueueing {kind} task: {e}")
+            return ServiceResult.failure_result(message=str(e), status_code=500)
+    def lease(self, worker_id: str, task_id: str = None) -> Optional[QueueTask]:
+        now = _now()
+        if task_id:
+            candidates = self._tasks().document(task_id)
+        else:
+            candidates = self._tasks().where('status', '==', 'pending').where('available_at', '<=', now).order_by('available_at').limit(1)
+        @firestore.transactional
+        def lease_in_transaction(transaction):
+            for snapshot in transaction.get(candidates):
+                task = snapshot.to_dict() if snapshot.exists else None
+                if not task or task['status'] != 'pending' or task['available_at'] > now:
+                    return None
+                lease_id = uuid.uuid4().hex
+                transaction.update(snapshot.reference, {
+                    'available_at': now + datetime.timedelta(seconds=settings.JOB_QUEUE_LEASE_SECONDS),
+                    'lease_id': lease_id,
+                    'worker_id': worker_id,
+                    'attempts': task['attempts'] + 1,
+                    'updated_at': firestore.SERVER_TIMESTAMP,
+                })
+                return QueueTask(snapshot.id, task['kind'], task['payload'], task['attempts'] + 1, lease_id)
+            return None
+        return lease_in_transaction(firestore_service.db.transaction())
+    def dispatch_due(self, max_tasks: int) -> int:
+        now = _now()
+        due = self._tasks().where('status', '==', 'pending').where('available_at', '<=', now).order_by('available_at').limit(max_tasks)
+        @firestore.transactional
+        def requeue_in_transaction(transaction, task_ref):
+            snapshot = task_ref.get(transaction=transaction)
+            task = snapshot.to_dict() if snapshot.exists else None
+            if not task or task['status'] != 'pending' or task['available_at'] > now:
+                return None
+            new_ref = self._tasks().document()
+            transaction.create(new_ref, {
+                **task,
+                'available_at': now,
+                'lease_id': None,
+                'worker_id': None,
+                'requeued_from': snapshot.id,
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            })
+            transaction.update(task_ref, {
+                'status': 'requeued',
+                'requeued_as': new_ref.id,
+                'lease_id': None,
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            })
+            return new_ref.id
+        dispatched = 0
+        for snapshot in due.stream():
+            try:
+                new_id = requeue_in_transaction(firestore_service.db.transaction(), snapshot.reference)
+            except Exception as e:
+                logging.error(f"Error requeueing task {snapshot.id}: {e}")
+                continue
+            if new_id:
+                logging.info(f"Requeued due task {snapshot.id} as {new_id}")
+                dispatched += 1
+        return dispatched
+    def heartbeat(self, task: QueueTask) -> bool:
+        task_ref = self._tasks().document(task.task_id)
+        @firestore.transactional
+        def extend_in_transaction(transaction):
+            snapshot = task_ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.get('lease_id') != task.lease_id:
+                return False
+            transaction.update(task_ref, {
+                'available_at': _now() + datetime.timedelta(seconds=settings.JOB_QUEUE_LEASE_SECONDS),
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            })
+            return True
+        return extend_in_transaction(firestore_service.db.transaction())
+    def complete(self, task: QueueTask):
+        self._tasks().document(task.task_id).update({
+            'status': 'done',
+            'lease_id': None,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        })
+    def fail(self, task: QueueTask, error_message: str):
+        update = {'lease_id': None, 'last_error': error_message, 'updated_at': firestore.SERVER_TIMESTAMP}
+        if task.is_final_attempt:
+            update['status'] = 'dead'
+        else:
+            update['available_at'] = _now() + datetime.timedelta(seconds=retry_delay_seconds(task.attempts))
+        self._tasks().document(task.task_id).update(update)
+class LocalJobQueue(BaseJobQueue):
+    runs_in_process = True
+    def __init__(self, max_workers: int):
+        super().__init__()
+        self.tasks = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="local-queue")
+    def _drain(self):
+        self._executor.submit(QueueWorker(self).run_until_empty)
+    def enqueue(self, kind: str, payload: dict, delay_seconds: int = 0) -> ServiceResult:
+        task_id = uuid.uuid4().hex
+        with self._lock:
+            self.tasks[task_id] = {
+                'kind': kind,
+                'payload': payload,
+                'status': 'pending',
+                'attempts': 0,
+                'available_at': _now() + datetime.timedelta(seconds=delay_seconds),
+                'lease_id': None,
+            }
+        if delay_seconds:
+            threading.Timer(delay_seconds, self._drain).start()
+        else:
+            self._drain()
+        return ServiceResult.success_result(data={'task_id': task_id}, status_code=201)
+    def lease(self, worker_id: str, task_id: str = None) -> Optional[QueueTask]:
+        now = _now()
+        with self._lock:
+            candidates = [task_id] if task_id else sorted(self.tasks, key=lambda key: self.tasks[key]['available_at'])
+            for candidate_id in candidates:
+                task = self.tasks.get(candidate_id)
+                if not task or task['status'] != 'pending' or task['available_at'] > now:
+                    continue
+                task['attempts'] += 1
+                task['lease_id'] = uuid.uuid4().hex
+                task['worker_id'] = worker_id
+                task['available_at'] = now + datetime.timedelta(seconds=settings.JOB_QUEUE_LEASE_SECONDS)
+                return QueueTask(candidate_id, task['kind'], task['payload'], task['attempts'], task['lease_id'])
+        return None
+    def heartbeat(self, task: QueueTask) -> bool:
+        with self._lock:
+            stored = self.tasks.get(task.task_id)
+            if not stored or stored['lease_id'] != task.lease_id:
+                return False
+            stored['available_at'] = _now() + datetime.timedelta(seconds=settings.JOB_QUEUE_LEASE_SECONDS)
+            return True
+    def complete(self, task: QueueTask):
+        with self._lock:
+            self.tasks[task.task_id].update({'status': 'done', 'lease_id': None})
+    def fail(self, task: QueueTask, error_message: str):
+        delay_seconds = retry_delay_seconds(task.attempts)
+        with self._lock:
+            stored = self.tasks[task.task_id]
+            stored.update({'lease_id': None, 'last_error': error_message})
+            if task.is_final_attempt:
+                stored['status'] = 'dead'
+                return
+            stored['available_at'] = _now() + datetime.timedelta(seconds=delay_seconds)
+        threading.Timer(delay_seconds, self._drain).start()
+class QueueWorker:
+    def __init__(self, queue, worker_id: str = None):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+    def _heartbeat(self, task: QueueTask, stop: threading.Event):
+        while not stop.wait(settings.JOB_QUEUE_HEARTBEAT_SECONDS):
+            try:
+                if not self.queue.heartbeat(task):
+                    logging.warning(f"Worker {self.worker_id} lost the lease on task {task.task_id}")
+                    return
+            except Exception as e:
+                logging.warning(f"Heartbeat failed for task {task.task_id}: {e}")
+    def run_task(self, task: QueueTask) -> ServiceResult:
+        handler = self.queue.handlers.get(task.kind)
+        if not handler:
+            result = ServiceResult.failure_result(f"No handler registered for task kind '{task.kind}'", 500)
+            self.queue.fail(task, result.message)
+            return result
+        logging.info(f"Worker {self.worker_id} running {task.kind} task {task.task_id} (attempt {task.attempts}).")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(task, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(task)
+        except Exception as e:
+            logging.error(f"Task {task.task_id} raised: {e}")
+            result = ServiceResult.failure_result(str(e), 500)
+        finally:
+            stop.set()
+            heartbeat.join()
+        if result.success:
+            self.queue.complete(task)
+        else:
+            logging.warning(f"Task {task.task_id} failed on attempt {task.attempts}: {result.message}")
+            self.queue.fail(task, result.message)
+        return result
+    def run_once(self, task_id: str = None) -> bool:
+        task = self.queue.lease(self.worker_id, task_id=task_id)
+        if not task:
+            return False
+        self.run_task(task)
+        return True
+    def run_until_empty(self, max_tasks: int = None) -> int:
+        processed = 0
+        while (max_tasks is None or processed < max_tasks) and self.run_once():
+            processed += 1
+        return processed
+    def run_forever(self, poll_seconds: float = 5.0):
+        logging.info(f"Worker {self.worker_id} polling for tasks.")
+        while True:
+            if not self.run_once():
+                time.sleep(poll_seconds)
+def build_job_queue():
+    if settings.JOB_QUEUE_BACKEND == 'local':
+        return LocalJobQueue(max_workers=settings.JOB_QUEUE_LOCAL_WORKERS)
+    return FirestoreJobQueue(collection=settings.JOB_QUEUE_COLLECTION)
+job_queue = build_job_queue()
@@ -17,5 +17,6 @@ class QuestionAnswer(BaseModel):
     question: str
     answer: str
     is_homework_problem: bool
+    page_number: Optional[int] = None
 class PageProcessingResponse(BaseModel):
     questions_and_answers: List[QuestionAnswer]
\ No newline at end of file
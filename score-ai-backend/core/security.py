@@ -1,19 +1,44 @@
+import hashlib
+import threading
+import time
 from functools import wraps
+from typing import Optional
+from cachetools import TLRUCache
 from flask import request, g, jsonify
-import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_admin import auth
 from config import settings
-def initialize_firebase():
-    try:
-        firebase_admin.get_app()
-    except ValueError:
-        cred = credentials.ApplicationDefault()
-        firebase_admin.initialize_app(cred, {
-            'projectId': settings.PROJECT_ID,
-        })
+from core.clients import get_firebase_app
+from core.metrics import timed
+class TokenCache:
+    def __init__(self, max_entries: int, recheck_seconds: int):
+        self.recheck_seconds = recheck_seconds
+        self._cache = TLRUCache(maxsize=max_entries, ttu=lambda key, value, now: value['expires_at'], timer=time.time)
+        self._lock = threading.Lock()
+    def _key(self, id_token: str) -> str:
+        return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+    def get(self, id_token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._cache.get(self._key(id_token))
+        return entry['decoded_token'] if entry else None
+    def set(self, id_token: str, decoded_token: dict):
+        if self.recheck_seconds <= 0:
+            return
+        expires_at = min(decoded_token.get('exp', 0), time.time() + self.recheck_seconds)
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._cache[self._key(id_token)] = {'decoded_token': decoded_token, 'expires_at': expires_at}
+token_cache = TokenCache(
+    max_entries=settings.AUTH_TOKEN_CACHE_SIZE,
+    recheck_seconds=settings.AUTH_REVOCATION_RECHECK_SECONDS,
+)
 def verify_firebase_token(id_token: str):
     try:
-        decoded_token = auth.verify_id_token(id_token, check_revoked=True)
+        cached_token = token_cache.get(id_token)
+        if cached_token:
+            return cached_token
+        decoded_token = auth.verify_id_token(id_token, app=get_firebase_app(), check_revoked=True)
+        token_cache.set(id_token, decoded_token)
         return decoded_token
     except auth.RevokedIdTokenError:
         raise Exception("ID token has been revoked.")
@@ -31,10 +56,10 @@ def login_required(f):
             return jsonify({"message": "Authorization header is missing or invalid"}), 401
         id_token = auth_header.split('Bearer ')[1]
         try:
-            decoded_token = verify_firebase_token(id_token)
+            with timed('auth_verify'):
+                decoded_token = verify_firebase_token(id_token)
             g.user = decoded_token
         except Exception as e:
             return jsonify({"message": "Token verification failed", "error": str(e)}), 401
         return f(*args, **kwargs)
-    return decorated_function
-initialize_firebase()
\ No newline at end of file
+    return decorated_function
\ No newline at end of file
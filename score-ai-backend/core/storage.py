@@ -1,25 +1,70 @@
+import base64
+import io
 import logging
 import datetime
-from google.cloud import storage
+import google_crc32c
 from config import settings
+from core.clients import get_bucket, get_storage_client
 from core.schemas import ServiceResult
+class UploadTooLargeError(Exception):
+    pass
+class ChecksummedReader:
+    # Keeps the bytes since the last read position so a resumable upload can seek back into the chunk it retries.
+    def __init__(self, stream, max_bytes: int):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.position = 0
+        self.buffer = b''
+        self.buffer_start = 0
+        self.checksum = google_crc32c.Checksum()
+    def read(self, size: int = -1) -> bytes:
+        self.buffer = self.buffer[self.position - self.buffer_start:]
+        self.buffer_start = self.position
+        replay = self.buffer[:len(self.buffer) if size is None or size < 0 else size]
+        chunk = b''
+        if size is None or size < 0 or len(replay) < size:
+            chunk = self.stream.read(-1 if size is None or size < 0 else size - len(replay))
+            self.bytes_read += len(chunk)
+            if self.bytes_read > self.max_bytes:
+                raise UploadTooLargeError(f"File exceeds the maximum upload size of {self.max_bytes} bytes.")
+            self.checksum.update(chunk)
+            self.buffer += chunk
+        self.position += len(replay) + len(chunk)
+        return replay + chunk
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        target = offset if whence == io.SEEK_SET else self.position + offset if whence == io.SEEK_CUR else None
+        if target is None or not self.buffer_start <= target <= self.bytes_read:
+            raise io.UnsupportedOperation(f"Can only seek within the buffered chunk, not to {offset} (whence {whence}).")
+        self.position = target
+        return target
+    def tell(self) -> int:
+        return self.position
+    def crc32c(self) -> str:
+        return base64.b64encode(self.checksum.digest()).decode('ascii')
 class Storage:
     def __init__(self):
-        self.client = storage.Client(project=settings.PROJECT_ID)
         self.bucket_name = settings.STORAGE_BUCKET
+    @property
+    def client(self):
+        return get_storage_client()
     def get_bucket(self):
-        return self.client.get_bucket(self.bucket_name)
-    def upload_file(self, source_file_name: str, destination_blob_name: str, content_type: str = None) -> ServiceResult:
+        return get_bucket()
+    def upload_stream(self, stream, destination_blob_name: str, content_type: str = None, max_bytes: int = None) -> ServiceResult:
         try:
+            reader = ChecksummedReader(stream, max_bytes or settings.UPLOAD_MAX_BYTES)
             bucket = self.get_bucket()
-            blob = bucket.blob(destination_blob_name)
-            with open(source_file_name, "rb") as f:
-                blob.upload_from_file(f, content_type=content_type)
+            blob = bucket.blob(destination_blob_name, chunk_size=settings.UPLOAD_CHUNK_SIZE)
+            # if_generation_match=0 makes the create idempotent, which turns on the client's chunk retries.
+            blob.upload_from_file(reader, content_type=content_type, checksum="crc32c", if_generation_match=0)
             gcs_path = f"gs://{self.bucket_name}/{destination_blob_name}"
-            logging.info(f"File {source_file_name} uploaded to {destination_blob_name} with content type {content_type}.")
-            return ServiceResult.success_result(data={'gcs_path': gcs_path})
+            logging.info(f"Streamed {reader.bytes_read} bytes to {destination_blob_name} with content type {content_type}, crc32c {reader.crc32c()}.")
+            return ServiceResult.success_result(data={'gcs_path': gcs_path, 'size': reader.bytes_read, 'crc32c': reader.crc32c()})
+        except UploadTooLargeError as e:
+            logging.warning(f"Rejected upload {destination_blob_name}: {e}")
+            return ServiceResult.failure_result(message=str(e), status_code=413)
         except Exception as e:
-            logging.error(f"Error uploading file: {e}")
+            logging.error(f"Error streaming upload: {e}")
             return ServiceResult.failure_result(message=str(e), status_code=500)
     def generate_signed_url(self, blob_name: str, expiration_mins: int = 15) -> ServiceResult:
         try:
@@ -34,4 +79,20 @@ class Storage:
         except Exception as e:
             logging.error(f"Error generating signed URL: {e}")
             return ServiceResult.failure_result(message=str(e), status_code=500)
+    def blob_name_from_gcs_path(self, gcs_path: str) -> str:
+        return gcs_path.replace(f"gs://{self.bucket_name}/", "")
+    def delete_blobs(self, gcs_paths: list, batch_size: int = 100) -> ServiceResult:
+        try:
+            prefix = f"gs://{self.bucket_name}/"
+            blob_names = [self.blob_name_from_gcs_path(path) for path in gcs_paths if path and path.startswith(prefix)]
+            bucket = self.get_bucket()
+            for i in range(0, len(blob_names), batch_size):
+                with self.client.batch(raise_exception=False):
+                    for blob_name in blob_names[i:i + batch_size]:
+                        bucket.blob(blob_name).delete()
+            logging.info(f"Deleted {len(blob_names)} blobs from {self.bucket_name}.")
+            return ServiceResult.success_result(data={'deleted_count': len(blob_names)})
+        except Exception as e:
+            logging.error(f"Error deleting blobs: {e}")
+            return ServiceResult.failure_result(message=str(e), status_code=500)
 storage_service = Storage()
\ No newline at end of file
@@ -1,5 +1,7 @@
-from firebase_functions import https_fn
+from firebase_functions import https_fn, firestore_fn, scheduler_fn
 from app import create_app
+from config import settings
+from core.queue import job_queue, QueueWorker
 
 app = create_app()
 
@@ -8,5 +10,18 @@ def api(req: https_fn.Request) -> https_fn.Response:
     with app.request_context(req.environ):
         return app.full_dispatch_request()
 
+@firestore_fn.on_document_created(
+    document=f"{settings.JOB_QUEUE_COLLECTION}/{{task_id}}",
+    database=settings.FIRESTORE_DB,
+    timeout_sec=540,
+    memory=1024,
+)
+def run_queued_task(event: firestore_fn.Event[firestore_fn.DocumentSnapshot]) -> None:
+    QueueWorker(job_queue).run_once(task_id=event.params["task_id"])
+
+@scheduler_fn.on_schedule(schedule="every 5 minutes", timeout_sec=120, memory=256)
+def sweep_job_queue(event: scheduler_fn.ScheduledEvent) -> None:
+    job_queue.dispatch_due(max_tasks=100)
+
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=8080)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=8080)
@@ -1,9 +1,37 @@
-from flask import Blueprint, request, jsonify, g
+import datetime
+import json
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
+from config import settings
 from . import analysis_service
 from core.security import login_required
 from core.firestore import firestore_service
 
 analysis_bp = Blueprint("analysis", __name__)
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_sse(event: str, event_id: str, payload: dict) -> str:
+    if event == "keepalive":
+        return ": keepalive\n\n"
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(payload, default=_json_default)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_stream(events):
+    try:
+        for event in events:
+            yield encode_sse(*event)
+    finally:
+        events.close()
 
 
 @analysis_bp.route("/jobs", methods=["GET"])
@@ -14,22 +42,53 @@ def get_jobs():
     ---
     security:
       - bearerAuth: []
+    parameters:
+      - in: query
+        name: page_size
+        type: integer
+        required: false
+        description: The number of jobs to return per page. When page_size or cursor is given the response is an object with jobs and next_cursor.
+      - in: query
+        name: cursor
+        type: string
+        required: false
+        description: The next_cursor value from the previous page.
+      - in: query
+        name: status
+        type: string
+        required: false
+        description: Only return jobs with this status, e.g. processing, completed or failed.
     responses:
       200:
-        description: A list of jobs for the user.
+        description: A list of jobs for the user, or a page of jobs with next_cursor.
         schema:
           type: array
           items:
             type: object
+      400:
+        description: Invalid page_size or cursor parameter.
       500:
         description: Internal server error.
     """
     user_id = g.user["uid"]
-    result = firestore_service.get_jobs_for_user(user_id)
-    if result.success:
+    paginated = "page_size" in request.args or "cursor" in request.args
+    try:
+        page_size = int(request.args.get("page_size", 20)) if paginated else None
+    except ValueError:
+        return jsonify({"message": "Invalid page_size parameter."}), 400
+    if page_size is not None and page_size <= 0:
+        return jsonify({"message": "Invalid page_size parameter."}), 400
+    result = firestore_service.get_jobs_for_user(
+        user_id,
+        page_size=page_size,
+        cursor=request.args.get("cursor"),
+        status=request.args.get("status"),
+    )
+    if not result.success:
+        return jsonify({"message": result.message}), result.status_code
+    if paginated:
         return jsonify(result.data), 200
-    else:
-        return jsonify({"message": result.message}), 500
+    return jsonify(result.data["jobs"]), 200
 
 
 @analysis_bp.route("/jobs", methods=["DELETE"])
@@ -41,34 +100,65 @@ def clear_all_jobs():
     security:
       - bearerAuth: []
     responses:
-      200:
-        description: Number of jobs deleted.
+      202:
+        description: Deletion started in the background.
         schema:
           type: object
           properties:
             message:
               type: string
-            deleted_count:
-              type: integer
+            deletion_id:
+              type: string
       500:
         description: Internal server error.
     """
     user_id = g.user["uid"]
-    result = firestore_service.delete_all_jobs_for_user(user_id)
+    result = analysis_service.start_delete_all_jobs(user_id)
     if result.success:
         return (
             jsonify(
                 {
-                    "message": f"Deleted {result.data['deleted_count']} jobs successfully",
-                    "deleted_count": result.data["deleted_count"],
+                    "message": "Deleting jobs in the background",
+                    "deletion_id": result.data["deletion_id"],
                 }
             ),
-            200,
+            202,
         )
     else:
         return jsonify({"message": result.message}), result.status_code
 
 
+@analysis_bp.route("/jobs/deletions/<deletion_id>", methods=["GET"])
+@login_required
+def get_deletion(deletion_id: str):
+    """
+    Get Progress of a Bulk Deletion
+    ---
+    security:
+      - bearerAuth: []
+    parameters:
+      - in: path
+        name: deletion_id
+        type: string
+        required: true
+        description: The ID returned by DELETE /analysis/jobs.
+    responses:
+      200:
+        description: Deletion status with total_jobs, deleted_jobs and deleted_files.
+      403:
+        description: Unauthorized.
+      404:
+        description: Deletion not found.
+    """
+    user_id = g.user["uid"]
+    result = firestore_service.get_deletion(deletion_id)
+    if not result.success:
+        return jsonify({"message": result.message}), result.status_code
+    if result.data.get("user_id") != user_id:
+        return jsonify({"message": "Unauthorized"}), 403
+    return jsonify(result.data), 200
+
+
 @analysis_bp.route("/jobs/<job_id>", methods=["DELETE"])
 @login_required
 def delete_job(job_id: str):
@@ -100,7 +190,7 @@ def delete_job(job_id: str):
     job_data = job_result.data
     if job_data.get("user_id") != user_id:
         return jsonify({"message": "Unauthorized to delete this job"}), 403
-    delete_result = firestore_service.delete_job(job_id)
+    delete_result = analysis_service.delete_job(job_id, job_data.get("file_gcs_path"))
     if delete_result.success:
         return jsonify({"message": "Job deleted successfully"}), 200
     else:
@@ -123,19 +213,34 @@ def solve():
         type: file
         required: true
         description: The file to upload for analysis.
+      - in: query
+        name: mode
+        type: string
+        enum: [interactive, batch]
+        required: false
+        description: >
+          `batch` queues the job for the Gemini Batch API instead of processing it right away. Results usually
+          arrive within hours and do not compete with interactive jobs for rate limit. May also be sent as a form field.
     responses:
       200:
         description: Job created successfully.
       400:
-        description: Bad request, e.g., no file part.
+        description: Bad request, e.g., no file part or an unknown mode.
+      413:
+        description: File exceeds the maximum upload size.
       500:
         description: Internal server error.
     """
     user_id = g.user["uid"]
+    if request.content_length and request.content_length > settings.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+        return jsonify({"message": "File exceeds the maximum upload size."}), 413
     if "file" not in request.files:
         return jsonify({"message": "No file part in the request"}), 400
+    mode = request.args.get("mode") or request.form.get("mode") or "interactive"
+    if mode not in ("interactive", "batch"):
+        return jsonify({"message": "mode must be 'interactive' or 'batch'."}), 400
     file = request.files["file"]
-    result = analysis_service.upload_and_create_job(file=file, user_id=user_id)
+    result = analysis_service.upload_and_create_job(file=file, user_id=user_id, mode=mode)
     if result.success:
         return jsonify(result.data), result.status_code
     else:
@@ -166,9 +271,14 @@ def get_solution(job_id: str):
         type: string
         required: false
         description: The cursor for pagination.
+      - in: query
+        name: all
+        type: boolean
+        required: false
+        description: Return every result in one response instead of one page.
     responses:
       200:
-        description: Job details and results.
+        description: Job details and results. While the job is still processing, results holds the pages finished so far.
       400:
         description: Invalid page_size parameter.
       403:
@@ -183,13 +293,18 @@ def get_solution(job_id: str):
     job_data = job_result.data
     if job_data.get("user_id") != user_id:
         return jsonify({"message": "Unauthorized"}), 403
-    if job_data.get("status") != "completed":
+    if job_data.get("status") not in ("completed", "processing"):
         return jsonify(job_data), 200
     try:
         page_size = int(request.args.get("page_size", 10))
     except ValueError:
         return jsonify({"message": "Invalid page_size parameter."}), 400
+    if page_size <= 0:
+        return jsonify({"message": "Invalid page_size parameter."}), 400
     cursor = request.args.get("cursor")
+    fetch_all = request.args.get("all", "").lower() in ("1", "true", "yes")
+    if fetch_all or (not cursor and job_data.get("page_count", 0) <= page_size):
+        page_size = None
     results_result = firestore_service.get_job_results_paginated(
         job_id, page_size, cursor
     )
@@ -197,3 +312,57 @@ def get_solution(job_id: str):
         return jsonify({"message": results_result.message}), results_result.status_code
     response_data = {**job_data, **results_result.data}
     return jsonify(response_data), 200
+
+
+@analysis_bp.route("/solve/<job_id>/events", methods=["GET"])
+@login_required
+def stream_solution_events(job_id: str):
+    """
+    Stream Job Progress
+    ---
+    security:
+      - bearerAuth: []
+    produces:
+      - text/event-stream
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+        description: The ID of the job to follow.
+      - in: header
+        name: Last-Event-ID
+        type: string
+        required: false
+        description: The id of the last page event received. Only pages written at or after it are replayed.
+    responses:
+      200:
+        description: >
+          Server-Sent Events. `page` events carry a page result as soon as it is written, `status` events carry
+          status, page_count and processed_pages, and `done` closes the stream once the job completes or fails.
+          `timeout` asks the client to reconnect with Last-Event-ID.
+      400:
+        description: Invalid Last-Event-ID.
+      403:
+        description: Unauthorized.
+      404:
+        description: Job not found.
+    """
+    user_id = g.user["uid"]
+    job_result = firestore_service.get_job(job_id)
+    if not job_result.success:
+        return jsonify({"message": job_result.message}), job_result.status_code
+    if job_result.data.get("user_id") != user_id:
+        return jsonify({"message": "Unauthorized"}), 403
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    if since:
+        try:
+            since = datetime.datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({"message": "Invalid Last-Event-ID."}), 400
+    events = analysis_service.stream_job_events(job_id, since)
+    return Response(
+        stream_with_context(sse_stream(events)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,48 +1,164 @@
 import logging
+import queue
+import time
 import uuid
-import os
-import threading
-from flask import current_app
 from werkzeug.utils import secure_filename
+from config import settings
 from core.storage import storage_service
 from core.firestore import firestore_service
+from core.queue import job_queue, QueueTask
 from core.schemas import ServiceResult
 from modules.processing import processing_service
-def run_processing_in_background(app, job_id, gcs_path):
-    with app.app_context():
-        logging.info(f"Background task started for job {job_id}.")
-        processing_service.solve_from_gcs_path(job_id, gcs_path)
-        logging.info(f"Background task finished for job {job_id}.")
+DELETION_PROGRESS_INTERVAL = 50
+TERMINAL_JOB_STATUSES = ('completed', 'failed')
+JOB_STATUS_FIELDS = ('status', 'page_count', 'processed_pages', 'error_message')
+def run_processing_in_background(task: QueueTask) -> ServiceResult:
+    job_id = task.payload['job_id']
+    logging.info(f"Background task started for job {job_id}.")
+    result = processing_service.solve_from_gcs_path(
+        job_id, task.payload['gcs_path'], final_attempt=task.is_final_attempt
+    )
+    logging.info(f"Background task finished for job {job_id}.")
+    return result
+def run_batch_submission_in_background(task: QueueTask) -> ServiceResult:
+    job_id = task.payload['job_id']
+    result = processing_service.submit_batch(job_id, task.payload['gcs_path'], final_attempt=task.is_final_attempt)
+    if result.success and result.data['pending']:
+        return job_queue.enqueue('poll_batch', task.payload, delay_seconds=settings.PROCESSING_BATCH_POLL_SECONDS)
+    return result
+def run_batch_poll_in_background(task: QueueTask) -> ServiceResult:
+    job_id = task.payload['job_id']
+    result = processing_service.poll_batch(job_id, task.payload['gcs_path'], final_attempt=task.is_final_attempt)
+    if result.success and not result.data['done']:
+        logging.info(f"Batch for job {job_id} still running, polling again in {settings.PROCESSING_BATCH_POLL_SECONDS}s.")
+        return job_queue.enqueue('poll_batch', task.payload, delay_seconds=settings.PROCESSING_BATCH_POLL_SECONDS)
+    return result
+def run_deletion_in_background(task: QueueTask) -> ServiceResult:
+    deletion_id = task.payload['deletion_id']
+    user_id = task.payload['user_id']
+    logging.info(f"Background deletion {deletion_id} started for user {user_id}.")
+    result = analysis_service.delete_all_jobs(deletion_id, user_id)
+    logging.info(f"Background deletion {deletion_id} finished for user {user_id}.")
+    return result
 class AnalysisService:
-    def upload_and_create_job(self, file, user_id: str) -> ServiceResult:
+    def stream_job_events(self, job_id: str, since=None):
+        events = queue.Queue()
+        def on_job(snapshots, changes, read_time):
+            for snapshot in snapshots:
+                if snapshot.exists:
+                    events.put(('status', snapshot.to_dict()))
+        def on_results(snapshots, changes, read_time):
+            for change in changes:
+                if change.type.name != 'REMOVED':
+                    events.put(('page', change.document.to_dict()))
+        sent_pages = {}
+        last_seen = since
+        def page_event(page):
+            nonlocal last_seen
+            key = page.get('created_at')
+            if sent_pages.get(page['page_number']) == key:
+                return None
+            sent_pages[page['page_number']] = key
+            if key and (last_seen is None or key > last_seen):
+                last_seen = key
+            return ('page', key.isoformat() if key else None, page)
+        unsubscribe = firestore_service.watch_job(job_id, since, on_job, on_results)
+        deadline = time.monotonic() + settings.JOB_EVENTS_MAX_SECONDS
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    yield ('timeout', None, {'message': 'Reconnect to keep receiving updates.'})
+                    return
+                try:
+                    kind, data = events.get(timeout=min(settings.JOB_EVENTS_KEEPALIVE_SECONDS, remaining))
+                except queue.Empty:
+                    yield ('keepalive', None, None)
+                    continue
+                if kind == 'page':
+                    event = page_event(data)
+                    if event:
+                        yield event
+                    continue
+                yield ('status', None, {field: data.get(field) for field in JOB_STATUS_FIELDS if field in data})
+                if data.get('status') in TERMINAL_JOB_STATUSES:
+                    unsubscribe()
+                    for page_doc in firestore_service.job_results_query(job_id, last_seen).stream():
+                        event = page_event(page_doc.to_dict())
+                        if event:
+                            yield event
+                    yield ('done', None, {'status': data['status']})
+                    return
+        finally:
+            unsubscribe()
+    def delete_job(self, job_id: str, file_gcs_path: str = None) -> ServiceResult:
+        delete_result = firestore_service.delete_job(job_id)
+        if delete_result.success and file_gcs_path:
+            blobs_result = storage_service.delete_blobs([file_gcs_path])
+            if not blobs_result.success:
+                logging.warning(f"Failed to delete file for job {job_id}: {blobs_result.message}")
+        return delete_result
+    def start_delete_all_jobs(self, user_id: str) -> ServiceResult:
+        deletion_result = firestore_service.create_deletion(user_id)
+        if not deletion_result.success:
+            return deletion_result
+        deletion_id = deletion_result.data['deletion_id']
+        enqueue_result = job_queue.enqueue('delete_jobs', {'deletion_id': deletion_id, 'user_id': user_id})
+        if not enqueue_result.success:
+            firestore_service.update_deletion(deletion_id, {'status': 'failed', 'error_message': enqueue_result.message})
+            return enqueue_result
+        return deletion_result
+    def delete_all_jobs(self, deletion_id: str, user_id: str) -> ServiceResult:
+        jobs_result = firestore_service.get_job_refs_for_user(user_id)
+        if not jobs_result.success:
+            return jobs_result
+        jobs = jobs_result.data
+        firestore_service.update_deletion(deletion_id, {'total_jobs': len(jobs)})
+        def on_progress(deleted_count):
+            if deleted_count % DELETION_PROGRESS_INTERVAL == 0:
+                firestore_service.update_deletion(deletion_id, {'deleted_jobs': deleted_count})
+        jobs_result = firestore_service.delete_jobs(jobs, on_progress=on_progress)
+        if not jobs_result.success:
+            firestore_service.update_deletion(deletion_id, {'status': 'failed', 'error_message': jobs_result.message})
+            return jobs_result
+        blobs_result = storage_service.delete_blobs([job.get('file_gcs_path') for job in jobs])
+        progress = {
+            'status': 'completed',
+            'deleted_jobs': jobs_result.data['deleted_count'],
+            'deleted_files': blobs_result.data['deleted_count'] if blobs_result.success else 0,
+        }
+        if not blobs_result.success:
+            progress['error_message'] = blobs_result.message
+        firestore_service.update_deletion(deletion_id, progress)
+        return ServiceResult.success_result(data=progress)
+    def upload_and_create_job(self, file, user_id: str, mode: str = 'interactive') -> ServiceResult:
         if not file or not file.filename:
             return ServiceResult.failure_result("No file provided.")
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}-{filename}"
-        temp_dir = "/tmp"
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-        local_path = os.path.join(temp_dir, unique_filename)
-        file.save(local_path)
-        upload_result = storage_service.upload_file(
-            source_file_name=local_path, 
+        upload_result = storage_service.upload_stream(
+            file.stream,
             destination_blob_name=unique_filename,
             content_type=file.content_type
         )
-        os.remove(local_path)
         if not upload_result.success:
             return upload_result
         gcs_path = upload_result.data['gcs_path']
-        job_result = firestore_service.create_job(user_id=user_id, file_gcs_path=gcs_path)
+        job_result = firestore_service.create_job(user_id=user_id, file_gcs_path=gcs_path, mode=mode)
         if job_result.success:
             job_id = job_result.data['job_id']
-            app = current_app._get_current_object()
-            thread = threading.Thread(
-                target=run_processing_in_background,
-                args=(app, job_id, gcs_path)
-            )
-            thread.daemon = True
-            thread.start()
-            logging.info(f"Job {job_id} created and background processing started.")
+            if job_queue.runs_in_process and upload_result.data['size'] <= settings.PROCESSING_HANDOFF_MAX_BYTES:
+                file.stream.seek(0)
+                processing_service.stage_upload(job_id, file.stream.read(), file.content_type)
+            task_kind = 'solve_batch' if mode == 'batch' else 'solve'
+            enqueue_result = job_queue.enqueue(task_kind, {'job_id': job_id, 'gcs_path': gcs_path})
+            if not enqueue_result.success:
+                firestore_service.update_job(job_id, {'status': 'failed', 'error_message': enqueue_result.message})
+                return enqueue_result
+            logging.info(f"Job {job_id} created and queued for processing.")
         return job_result
-analysis_service = AnalysisService()
\ No newline at end of file
+analysis_service = AnalysisService()
+job_queue.register_handler('solve', run_processing_in_background)
+job_queue.register_handler('solve_batch', run_batch_submission_in_background)
+job_queue.register_handler('poll_batch', run_batch_poll_in_background)
+job_queue.register_handler('delete_jobs', run_deletion_in_background)
\ No newline at end of file
@@ -1,10 +1,46 @@
-from flask import Blueprint, request, jsonify, g, Response
+import json
+import logging
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
 from core.security import login_required
 from . import chat_service
 from core.firestore import firestore_service
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/chat")
 
+STREAM_MIMETYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+def stream_format(data: dict):
+    requested = request.args.get("stream") or data.get("stream")
+    if requested is True or requested == "true":
+        return "sse"
+    if requested in STREAM_MIMETYPES:
+        return requested
+    if request.accept_mimetypes.best == STREAM_MIMETYPES["sse"]:
+        return "sse"
+    return None
+
+
+def encode_event(fmt: str, event: str, payload: dict) -> str:
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"event": event, **payload}) + "\n"
+
+
+def stream_explanation(fmt: str, request_args: dict):
+    sent = 0
+    try:
+        for text in chat_service.stream_ai_explanation(request_args):
+            sent += len(text)
+            yield encode_event(fmt, "delta", {"text": text})
+        yield encode_event(fmt, "done", {"chars": sent})
+    except GeneratorExit:
+        logging.info(f"Client disconnected from explanation stream after {sent} chars")
+        raise
+    except Exception as e:
+        logging.error(f"Error streaming AI explanation: {e}")
+        yield encode_event(fmt, "error", {"message": f"Error: Failed to get AI explanation. {e}"})
+
 
 @chat_bp.route("/<job_id>/explain", methods=["POST"])
 @login_required
@@ -22,16 +58,26 @@ def explain_question(job_id: str):
         type: string
         required: true
         description: The ID of the job to which the question pertains.
+      - in: query
+        name: stream
+        type: string
+        enum: [sse, ndjson]
+        required: false
+        description: Stream the answer as Server-Sent Events or NDJSON instead of one JSON body. Also enabled by `"stream": true` in the body or `Accept: text/event-stream`.
       - in: body
         name: body
         schema:
           type: object
-          required:
-            - question
           properties:
             question:
-              type: string
-              description: The question to be explained.
+              type: object
+              description: The question and answer to be explained. Required unless page_number and question_index are given.
+            page_number:
+              type: integer
+              description: Page of the job's results that holds the question.
+            question_index:
+              type: integer
+              description: Position of the question on that page. With page_number, the server loads the question itself.
             chat_history:
               type: array
               items:
@@ -46,11 +92,11 @@ def explain_question(job_id: str):
             explanation:
               type: string
       400:
-        description: Bad Request, e.g., question is missing.
+        description: Bad Request, e.g., neither question nor page_number and question_index were given.
       403:
         description: Unauthorized to access this job.
       404:
-        description: Job not found.
+        description: Job, page or question not found.
     """
     user_id = g.user["uid"]
     job_result = firestore_service.get_job(job_id)
@@ -64,9 +110,31 @@ def explain_question(job_id: str):
     question = data.get("question")
     chat_history = data.get("chat_history", [])
 
+    if data.get("page_number") is not None and data.get("question_index") is not None:
+        try:
+            page_number = int(data["page_number"])
+            question_index = int(data["question_index"])
+        except (TypeError, ValueError):
+            return jsonify({"message": "page_number and question_index must be integers"}), 400
+        question_result = chat_service.load_question(job_id, page_number, question_index)
+        if not question_result.success:
+            return jsonify({"message": question_result.message}), question_result.status_code
+        question = question_result.data
+
     if not question:
         return jsonify({"message": "Question is required"}), 400
 
+    fmt = stream_format(data)
+    if fmt:
+        prepared = chat_service.prepare_request(question=question, chat_history=chat_history)
+        if not prepared.success:
+            return jsonify({"message": prepared.message}), prepared.status_code
+        return Response(
+            stream_with_context(stream_explanation(fmt, prepared.data)),
+            mimetype=STREAM_MIMETYPES[fmt],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     result = chat_service.get_ai_explanation(
         question=question, chat_history=chat_history
     )
@@ -1,69 +1,161 @@
+import hashlib
 import logging
-from google import genai
+from google.genai import types
 from config import settings
+from core.cache import MemoryCache
+from core.clients import get_genai_client
+from core.firestore import firestore_service
+from core.governor import gemini_governor
 from core.schemas import ServiceResult
 
+MODEL_ROLES = {"model", "assistant"}
+DEFAULT_USER_MESSAGE = "Please explain how to solve this problem."
+
 
 class ChatService:
     def __init__(self):
+        self.model_name = settings.GEMINI_MODEL_NAME
+        self.page_results = MemoryCache(
+            max_entries=settings.CHAT_QUESTION_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.CHAT_QUESTION_CACHE_TTL_SECONDS,
+        )
+        self.context_caches = MemoryCache(
+            max_entries=settings.CHAT_QUESTION_CACHE_MAX_ENTRIES,
+            ttl_seconds=max(60, settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS - 60),
+        )
+
+    @property
+    def client(self):
         try:
-            self.client = genai.Client()
-            self.model_name = settings.GEMINI_MODEL_NAME
+            return get_genai_client()
         except Exception as e:
             logging.error(f"Error initializing ChatService: {e}")
-            self.client = None
+            return None
 
-    def get_ai_explanation(self, question: dict, chat_history: list) -> ServiceResult:
+    def prepare_request(self, question: dict, chat_history: list) -> ServiceResult:
         if not self.client:
             logging.error("Chat client not initialized.")
             return ServiceResult.failure_result("Error: Chat client is not initialized. Please check the server logs.", 500)
 
+        contents = self.build_contents(chat_history)
+        if contents[-1].role != "user":
+            return ServiceResult.failure_result("The last chat message must come from the user.", 400)
+        context = self.build_context(question)
+        cached_content = self.get_context_cache(context)
+        if cached_content:
+            config = types.GenerateContentConfig(cached_content=cached_content)
+        else:
+            config = types.GenerateContentConfig(system_instruction=context)
+        return ServiceResult.success_result(data={
+            "model": self.model_name,
+            "contents": contents,
+            "config": config,
+        })
+
+    def load_question(self, job_id: str, page_number: int, question_index: int) -> ServiceResult:
+        cache_key = f"{job_id}:{page_number}"
+        results = self.page_results.get(cache_key)
+        if results is None:
+            page_result = firestore_service.get_page_result(job_id, page_number)
+            if not page_result.success:
+                return page_result
+            results = page_result.data.get("results") or []
+            self.page_results.set(cache_key, results)
+        if not 0 <= question_index < len(results):
+            return ServiceResult.failure_result("Question not found", 404)
+        return ServiceResult.success_result(data=results[question_index])
+
+    def get_context_cache(self, context: str):
+        if not settings.GEMINI_CONTEXT_CACHE_ENABLED or len(context) < settings.GEMINI_CONTEXT_CACHE_MIN_CHARS:
+            return None
+        cache_key = hashlib.sha256(f"{self.model_name}\n{context}".encode("utf-8")).hexdigest()
+        cached_name = self.context_caches.get(cache_key)
+        if cached_name is not None:
+            return cached_name or None
         try:
-            initial_context = self.build_context(question)
-            
-            if chat_history and len(chat_history) > 1:
-                chat = self.client.chats.create(model=self.model_name)
-                
-                for i, message in enumerate(chat_history[:-1]):
-                    content = message.get("content", "")
-                    if not isinstance(content, str):
-                        content = str(content)
-                    
-                    if i == 0 and message["role"] == "user":
-                        content = f"{initial_context}\n\nHere is my question:\n{content}"
-                    
-                    if message["role"] == "user":
-                        chat.send_message(content)
-                
-                last_message = chat_history[-1]
-                if last_message["role"] == "user":
-                    content = last_message.get("content", "")
-                    if not isinstance(content, str):
-                        content = str(content)
-                    
-                    response = chat.send_message(content)
-                    return ServiceResult.success_result(data={"explanation": response.text})
+            cached_content = self.client.caches.create(
+                model=self.model_name,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=context,
+                    display_name=f"chat-context-{cache_key[:16]}",
+                    ttl=f"{settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS}s",
+                ),
+            )
+            cached_name = cached_content.name
+            logging.info(f"Created Gemini context cache {cached_name}")
+        except Exception as e:
+            logging.warning(f"Could not create Gemini context cache, sending context inline: {e}")
+            cached_name = ""
+        self.context_caches.set(cache_key, cached_name)
+        return cached_name or None
 
-            else:
-                if chat_history:
-                    content = chat_history[-1].get("content", "")
-                    if not isinstance(content, str):
-                        content = str(content)
-                    content = f"{initial_context}\n\nHere is my question:\n{content}"
-                else:
-                    content = initial_context
-                
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=[content]
-                )
-                
-                return ServiceResult.success_result(data={"explanation": response.text})
+    def get_ai_explanation(self, question: dict, chat_history: list) -> ServiceResult:
+        prepared = self.prepare_request(question, chat_history)
+        if not prepared.success:
+            return prepared
 
+        try:
+            response = gemini_governor.generate_content(self.client, **prepared.data)
+            return ServiceResult.success_result(data={"explanation": response.text})
         except Exception as e:
             logging.error(f"Error getting AI explanation: {e}")
             return ServiceResult.failure_result(f"Error: Failed to get AI explanation. {e}", 500)
 
+    def stream_ai_explanation(self, request_args: dict):
+        stream = gemini_governor.generate_content_stream(self.client, **request_args)
+        try:
+            for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+    def build_contents(self, chat_history: list) -> list:
+        messages = []
+        for message in chat_history or []:
+            content = message.get("content", "")
+            if not isinstance(content, str):
+                content = str(content)
+            role = "model" if message.get("role") in MODEL_ROLES else "user"
+            if not content.strip() or (role == "model" and content.startswith("Error:")):
+                continue
+            messages.append((role, content))
+
+        window = max(1, settings.CHAT_HISTORY_WINDOW)
+        earlier, recent = messages[:-window], messages[-window:]
+        summary = self.summarize_history(earlier)
+        if summary:
+            recent.insert(0, ("user", summary))
+        if not recent:
+            recent.append(("user", DEFAULT_USER_MESSAGE))
+
+        contents = []
+        for role, text in recent:
+            if contents and contents[-1].role == role:
+                contents[-1].parts.append(types.Part.from_text(text=text))
+            else:
+                contents.append(types.Content(role=role, parts=[types.Part.from_text(text=text)]))
+        return contents
+
+    def summarize_history(self, messages: list) -> str:
+        max_chars = settings.CHAT_HISTORY_SUMMARY_MAX_CHARS
+        if not messages or max_chars <= 0:
+            return ""
+        lines = []
+        used = 0
+        for role, text in reversed(messages):
+            line = f"{'Tutor' if role == 'model' else 'Student'}: {' '.join(text.split())}"
+            if used + len(line) > max_chars:
+                line = line[:max(0, max_chars - used)].rstrip() + "…"
+            lines.append(line)
+            used += len(line)
+            if used >= max_chars:
+                break
+        lines.reverse()
+        return "Summary of our earlier conversation (oldest first, may be truncated):\n" + "\n".join(lines)
+
     def build_context(self, question: dict) -> str:
         question_text = question.get("question", "")
         correct_answer = question.get("answer", "")
@@ -72,4 +164,4 @@ class ChatService:
         logging.info(f"Prompt template: {prompt_template}")
         return prompt_template.format(
             question_text=question_text, correct_answer=correct_answer
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,18 @@
+from flask import Blueprint, Response
+from core.metrics import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/", strict_slashes=False)
+def prometheus_metrics():
+    """
+    Prometheus Metrics
+    ---
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Per-stage latency histograms and Gemini token counters of this instance, in Prometheus text format.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
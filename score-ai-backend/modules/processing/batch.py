@@ -0,0 +1,109 @@
+import base64
+import logging
+import threading
+import uuid
+from dataclasses import dataclass, field
+from config import settings
+from core.clients import get_genai_client
+
+RUNNING_STATES = {"JOB_STATE_UNSPECIFIED", "JOB_STATE_QUEUED", "JOB_STATE_PENDING", "JOB_STATE_RUNNING",
+                  "JOB_STATE_PAUSED", "JOB_STATE_UPDATING", "JOB_STATE_CANCELLING"}
+SUCCEEDED_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+
+
+@dataclass
+class BatchStatus:
+    state: str
+    responses: list = field(default_factory=list)
+
+    @property
+    def running(self) -> bool:
+        return self.state == "running"
+
+
+class GeminiBatchBackend:
+    @staticmethod
+    def _to_content(contents: list):
+        from google.genai import types
+        parts = []
+        for item in contents:
+            if isinstance(item, str):
+                parts.append(types.Part.from_text(text=item))
+            else:
+                inline_data = item["inline_data"]
+                parts.append(types.Part.from_bytes(
+                    data=base64.b64decode(inline_data["data"]), mime_type=inline_data["mime_type"]
+                ))
+        return [types.Content(role="user", parts=parts)]
+
+    def submit(self, display_name: str, requests: list) -> str:
+        batch_job = get_genai_client().batches.create(
+            model=settings.GEMINI_MODEL_NAME,
+            src=[{"contents": self._to_content(request["contents"]), "config": request["config"]} for request in requests],
+            config={"display_name": display_name},
+        )
+        logging.info(f"Submitted Gemini batch {batch_job.name} with {len(requests)} requests.")
+        return batch_job.name
+
+    def get(self, name: str) -> BatchStatus:
+        batch_job = get_genai_client().batches.get(name=name)
+        state = getattr(batch_job.state, "name", str(batch_job.state))
+        if state in RUNNING_STATES:
+            return BatchStatus("running")
+        if state not in SUCCEEDED_STATES or not batch_job.dest or batch_job.dest.inlined_responses is None:
+            logging.warning(f"Gemini batch {name} ended in state {state}: {batch_job.error}")
+            return BatchStatus("failed")
+        return BatchStatus("succeeded", [
+            (
+                response.response.text if response.response else None,
+                response.error,
+                response.response.usage_metadata if response.response else None,
+            )
+            for response in batch_job.dest.inlined_responses
+        ])
+
+    def cancel(self, name: str):
+        get_genai_client().batches.cancel(name=name)
+        logging.info(f"Cancelled Gemini batch {name}.")
+
+
+class LocalBatchBackend:
+    """Runs batch requests synchronously on the first poll, for development and tests."""
+
+    def __init__(self):
+        self.batches = {}
+        self._lock = threading.Lock()
+
+    def submit(self, display_name: str, requests: list) -> str:
+        name = f"local-batches/{uuid.uuid4().hex}"
+        with self._lock:
+            self.batches[name] = {"display_name": display_name, "requests": requests, "responses": None}
+        return name
+
+    def get(self, name: str) -> BatchStatus:
+        with self._lock:
+            batch = self.batches.get(name)
+        if batch is None:
+            return BatchStatus("failed")
+        if batch["responses"] is None:
+            responses = []
+            for request in batch["requests"]:
+                try:
+                    response = get_genai_client().models.generate_content(
+                        model=settings.GEMINI_MODEL_NAME, contents=request["contents"], config=request["config"],
+                    )
+                    responses.append((response.text, None, getattr(response, "usage_metadata", None)))
+                except Exception as e:
+                    responses.append((None, str(e), None))
+            batch["responses"] = responses
+        return BatchStatus("succeeded", batch["responses"])
+
+    def cancel(self, name: str):
+        with self._lock:
+            self.batches.pop(name, None)
+
+
+def build_batch_backend():
+    if settings.PROCESSING_BATCH_BACKEND == "local":
+        return LocalBatchBackend()
+    return GeminiBatchBackend()
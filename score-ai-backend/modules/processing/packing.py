@@ -0,0 +1,58 @@
+import threading
+from .preprocess import PreparedPage
+
+
+def page_size_bytes(page_data) -> int:
+    if isinstance(page_data, PreparedPage):
+        return page_data.output_bytes
+    return len(page_data[1]) if isinstance(page_data, tuple) else len(page_data)
+
+
+class PackSizer:
+    def __init__(self, initial: int, maximum: int, latency_target: float):
+        self.maximum = max(1, maximum)
+        self.size = max(1, min(initial, self.maximum))
+        self.latency_target = latency_target
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        with self._lock:
+            return self.size
+
+    def record_success(self, pack_len: int, latency: float):
+        with self._lock:
+            if self.latency_target and latency > self.latency_target:
+                self.size = max(1, self.size - 1)
+            elif pack_len >= self.size:
+                self.size = min(self.maximum, self.size + 1)
+
+    def record_failure(self, pack_len: int):
+        with self._lock:
+            self.size = max(1, min(self.size, pack_len) // 2)
+
+
+def pack_pages(pages, sizer: PackSizer, max_bytes: int):
+    pack = []
+    pack_bytes = 0
+    for page_number, page_data in pages:
+        size = page_size_bytes(page_data)
+        if pack and (len(pack) >= sizer.current() or pack_bytes + size > max_bytes):
+            yield pack
+            pack, pack_bytes = [], 0
+        pack.append((page_number, page_data))
+        pack_bytes += size
+    if pack:
+        yield pack
+
+
+def split_answers(pack: list, answers: list):
+    page_numbers = [page_number for page_number, _ in pack]
+    results = {page_number: [] for page_number in page_numbers}
+    for answer in answers:
+        page_number = answer.pop("page_number", None)
+        if len(page_numbers) == 1:
+            page_number = page_numbers[0]
+        if page_number not in results:
+            return None
+        results[page_number].append(answer)
+    return results
@@ -0,0 +1,124 @@
+import io
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Optional
+import fitz
+from PIL import Image, ImageOps, ImageStat
+from config import settings
+from core.pdf import fitz_lock
+
+ANALYSIS_MAX_SIDE = 800
+INK_LEVEL = 160
+HASH_SIZE = 16
+ACADEMIC_TEXT_PATTERN = re.compile(r"[0-9=+\-*/^<>?%()\[\]√∫∑π≤≥×÷]")
+INSTRUCTION_PATTERN = re.compile(
+    r"^\W*(?:\w{1,3}[.)]\s*)?(?:write|explain|name|define|describe|list|compare|contrast|discuss|identify|solve|"
+    r"find|calculate|compute|show|prove|draw|label|translate|summari[sz]e|read|answer(?! key)|complete|fill|choose|circle|"
+    r"match|give|state|evaluate|simplify|determine|use|estimate|predict|analy[sz]e|justify|classify|outline|"
+    r"what|why|how|when|where|which|who)\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+SEPARATOR_TEXT_PATTERN = re.compile(
+    r"\b(?:answer key|answers|solutions|table of contents|contents|cover page|intentionally left blank|"
+    r"end of (?:the )?(?:exam|test|quiz|section|assignment|packet)|appendix|scratch (?:paper|work))\b",
+    re.IGNORECASE,
+)
+
+
+def _render_page(data) -> (Image.Image, str, float):
+    if isinstance(data, tuple) and data[0] == "IMAGE":
+        with Image.open(io.BytesIO(data[1])) as original:
+            image = ImageOps.exif_transpose(original).convert("L")
+        image.thumbnail((ANALYSIS_MAX_SIDE, ANALYSIS_MAX_SIDE))
+        return image, "", 0.0
+    with fitz_lock, fitz.open(stream=data, filetype="pdf") as document:
+        page = document[0]
+        scale = ANALYSIS_MAX_SIDE / max(page.rect.width, page.rect.height)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+        text = page.get_text("text").strip()
+        font_sizes = [
+            span["size"] for block in page.get_text("dict")["blocks"] for line in block.get("lines", [])
+            for span in line["spans"] if span["text"].strip()
+        ]
+    return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples), text, min(font_sizes, default=0.0)
+
+
+def looks_like_question(text: str) -> bool:
+    return "?" in text or bool(INSTRUCTION_PATTERN.search(text))
+
+
+def ink_coverage(image: Image.Image) -> float:
+    histogram = image.histogram()
+    return sum(histogram[:INK_LEVEL]) / max(1, image.width * image.height)
+
+
+def difference_hash(image: Image.Image) -> int:
+    pixels = list(image.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for column in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + column]
+            value = (value << 1) | (left > pixels[row * (HASH_SIZE + 1) + column + 1])
+    return value
+
+
+class PageFilter:
+    """Decides, per job, which pages can be skipped without a model call.
+
+    Pages are skipped when they are blank (almost no ink or a flat scan), when they are a cover or
+    separator (a short non-academic text layer that is either set entirely in a title-sized font or
+    names itself, e.g. "Answer Key"), or when they repeat an earlier page of the same upload. Text
+    that reads like a question or an instruction is never skipped.
+    """
+
+    def __init__(self):
+        self.hashes = []
+        self.checked = 0
+        self.skipped = Counter()
+        self._lock = threading.Lock()
+
+    def _classify(self, image: Image.Image, text: str, font_size: float) -> Optional[str]:
+        if ACADEMIC_TEXT_PATTERN.search(text) or looks_like_question(text):
+            return None
+        ink = ink_coverage(image)
+        if ink < settings.PAGE_FILTER_BLANK_INK or ImageStat.Stat(image).stddev[0] < settings.PAGE_FILTER_BLANK_STDDEV:
+            return "blank"
+        separator = SEPARATOR_TEXT_PATTERN.search(text) or font_size >= settings.PAGE_FILTER_TITLE_FONT_SIZE
+        if text and separator and len(text) <= settings.PAGE_FILTER_SPARSE_MAX_CHARS \
+                and ink < settings.PAGE_FILTER_SPARSE_INK:
+            return "sparse"
+        return None
+
+    def check(self, page_number: int, data) -> Optional[dict]:
+        if not settings.PAGE_FILTER_ENABLED:
+            return None
+        try:
+            image, text, font_size = _render_page(data)
+        except Exception as e:
+            logging.warning(f"Page filter could not analyse page {page_number}, keeping it: {e}")
+            return None
+        skip = None
+        reason = self._classify(image, text, font_size)
+        if reason:
+            skip = {"skip_reason": reason}
+        elif settings.PAGE_FILTER_DUPLICATE_DISTANCE >= 0:
+            page_hash = difference_hash(image)
+            with self._lock:
+                for seen_page, seen_hash, seen_text in self.hashes:
+                    if bin(page_hash ^ seen_hash).count("1") <= settings.PAGE_FILTER_DUPLICATE_DISTANCE \
+                            and seen_text == text:
+                        skip = {"skip_reason": "duplicate", "duplicate_of": seen_page}
+                        break
+                else:
+                    self.hashes.append((page_number, page_hash, text))
+        with self._lock:
+            self.checked += 1
+            if skip:
+                self.skipped[skip["skip_reason"]] += 1
+        return skip
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"checked": self.checked, "skipped": sum(self.skipped.values()), "reasons": dict(self.skipped)}
@@ -0,0 +1,209 @@
+import io
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+import fitz
+from PIL import Image, ImageOps
+from config import settings
+from core.pdf import fitz_lock
+
+IMAGE_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+MATH_FONT_PATTERN = re.compile(r"CMMI|CMSY|CMEX|CMBSY|MSAM|MSBM|Math|Symbol|STIX|Euclid|MT ?Extra|MTSY|Mathematica", re.IGNORECASE)
+REGION_PADDING = 4
+MIN_DRAWING_SIDE = 3
+PREPROCESS_SETTINGS = (
+    "PAGE_TEXT_ENABLED", "PAGE_TEXT_MIN_CHARS", "PAGE_TEXT_MAX_IMAGE_COVERAGE", "PAGE_TEXT_MAX_CROPS",
+    "PAGE_IMAGE_ENABLED", "PAGE_IMAGE_DPI", "PAGE_IMAGE_MAX_PIXELS", "PAGE_IMAGE_FORMAT", "PAGE_IMAGE_QUALITY",
+)
+
+
+@dataclass
+class PreparedPage:
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    transform: str
+    elapsed_ms: float = 0.0
+    text: Optional[str] = None
+    crops: List[Tuple[bytes, str]] = field(default_factory=list)
+    source: object = None
+
+    @property
+    def output_bytes(self) -> int:
+        if self.text is None:
+            return len(self.data)
+        return len(self.text.encode("utf-8")) + sum(len(crop) for crop, _ in self.crops)
+
+
+class PreprocessStats:
+    def __init__(self):
+        self.pages = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.elapsed_ms = 0.0
+        self.transforms = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, page: PreparedPage):
+        with self._lock:
+            self.pages += 1
+            self.bytes_in += page.original_bytes
+            self.bytes_out += page.output_bytes
+            self.elapsed_ms += page.elapsed_ms
+            self.transforms[page.transform] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pages": self.pages,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "avg_ms": round(self.elapsed_ms / self.pages, 1) if self.pages else 0.0,
+                "paths": dict(self.transforms),
+            }
+
+
+def _scale_for_budget(width: float, height: float, scale: float) -> float:
+    max_pixels = settings.PAGE_IMAGE_MAX_PIXELS
+    if width * height * scale * scale > max_pixels:
+        scale = math.sqrt(max_pixels / (width * height))
+    return scale
+
+
+def _encode_image(image: Image.Image) -> (bytes, str):
+    image_format = settings.PAGE_IMAGE_FORMAT.upper()
+    if image_format not in IMAGE_MIME_TYPES:
+        image_format = "JPEG"
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=settings.PAGE_IMAGE_QUALITY)
+    return buffer.getvalue(), IMAGE_MIME_TYPES[image_format]
+
+
+def _merge_regions(rects: list, padding: float) -> list:
+    regions = [fitz.Rect(rect) + (-padding, -padding, padding, padding) for rect in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                if regions[i].intersects(regions[j]):
+                    regions[i] |= regions.pop(j)
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+
+def _text_layer_regions(page: fitz.Page) -> Optional[list]:
+    page_area = abs(page.rect)
+    image_rects = [fitz.Rect(info["bbox"]) & page.rect for info in page.get_image_info()]
+    if sum(abs(rect) for rect in image_rects) > page_area * settings.PAGE_TEXT_MAX_IMAGE_COVERAGE:
+        return None
+    math_rects = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            if any(MATH_FONT_PATTERN.search(span["font"]) for span in line["spans"]):
+                math_rects.append(fitz.Rect(line["bbox"]))
+    drawing_rects = [
+        drawing["rect"] for drawing in page.get_drawings()
+        if drawing["rect"].width >= MIN_DRAWING_SIDE and drawing["rect"].height >= MIN_DRAWING_SIDE
+    ]
+    figures = [
+        region for region in _merge_regions(drawing_rects, REGION_PADDING * 2)
+        if abs(region) >= page_area * 0.01
+    ]
+    regions = [region & page.rect for region in _merge_regions(image_rects + math_rects + figures, REGION_PADDING)]
+    if len(regions) > settings.PAGE_TEXT_MAX_CROPS or sum(abs(region) for region in regions) > page_area * 0.5:
+        return None
+    return regions
+
+
+def _prepare_text_page(page: fitz.Page, pdf_bytes: bytes) -> Optional[PreparedPage]:
+    text = page.get_text("text", sort=True).strip()
+    if len(text) < settings.PAGE_TEXT_MIN_CHARS or text.count("\ufffd") > len(text) * 0.02:
+        return None
+    regions = _text_layer_regions(page)
+    if regions is None:
+        return None
+    crops = []
+    scale = settings.PAGE_IMAGE_DPI / 72
+    for region in regions:
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=region, alpha=False)
+        crops.append(_encode_image(Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)))
+    transform = "text+crops" if crops else "text"
+    return PreparedPage(pdf_bytes, "application/pdf", len(pdf_bytes), transform, text=text, crops=crops)
+
+
+def _prepare_pdf_page(pdf_bytes: bytes) -> PreparedPage:
+    passthrough = PreparedPage(pdf_bytes, "application/pdf", len(pdf_bytes), "passthrough")
+    with fitz_lock, fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        if len(document) != 1:
+            return passthrough
+        page = document[0]
+        if settings.PAGE_TEXT_ENABLED:
+            text_page = _prepare_text_page(page, pdf_bytes)
+            if text_page:
+                return text_page
+        if not settings.PAGE_IMAGE_ENABLED or not page.get_images():
+            return passthrough
+        scale = _scale_for_budget(page.rect.width, page.rect.height, settings.PAGE_IMAGE_DPI / 72)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    image_bytes, mime_type = _encode_image(image)
+    if len(image_bytes) >= len(pdf_bytes):
+        return passthrough
+    return PreparedPage(image_bytes, mime_type, len(pdf_bytes), "rasterised")
+
+
+def _prepare_image(image_bytes: bytes, content_type: str) -> PreparedPage:
+    passthrough = PreparedPage(image_bytes, content_type, len(image_bytes), "passthrough")
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+        scale = _scale_for_budget(width, height, 1.0)
+        if scale < 1.0:
+            image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+        encoded_bytes, mime_type = _encode_image(image)
+    if scale >= 1.0 and len(encoded_bytes) >= len(image_bytes):
+        return passthrough
+    return PreparedPage(encoded_bytes, mime_type, len(image_bytes), "downscaled" if scale < 1.0 else "reencoded")
+
+
+def preprocess_fingerprint() -> str:
+    return ";".join(f"{name}={getattr(settings, name)!r}" for name in PREPROCESS_SETTINGS)
+
+
+def prepare_page(data) -> PreparedPage:
+    started = time.perf_counter()
+    is_image = isinstance(data, tuple) and data[0] == "IMAGE"
+    if is_image:
+        _, file_bytes, content_type = data
+    else:
+        file_bytes, content_type = data, "application/pdf"
+    page = PreparedPage(file_bytes, content_type, len(file_bytes), "passthrough")
+    try:
+        if is_image and settings.PAGE_IMAGE_ENABLED:
+            page = _prepare_image(file_bytes, content_type)
+        elif not is_image and (settings.PAGE_IMAGE_ENABLED or settings.PAGE_TEXT_ENABLED):
+            page = _prepare_pdf_page(file_bytes)
+    except Exception as e:
+        logging.warning(f"Page preprocessing failed, sending original bytes: {e}")
+    page.source = data
+    page.elapsed_ms = (time.perf_counter() - started) * 1000
+    logging.info(
+        f"Prepared page ({page.transform}): {page.original_bytes} -> {page.output_bytes} bytes in {page.elapsed_ms:.1f} ms"
+    )
+    return page
@@ -1,54 +1,102 @@
 import logging
-import io
 import base64
-import fitz
+import datetime
+import hashlib
+import threading
+import time
+from cachetools import TTLCache
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from config import settings
-from google import genai
-from google.cloud import storage
+from core.cache import build_result_cache
+from core.clients import get_bucket, get_genai_client
 from core.firestore import firestore_service
+from core.governor import gemini_governor
+from core.metrics import JOB_TOKENS, PAGE_TOKENS, record_usage, timed, usage_tokens
+from core.pdf import open_pdf, iter_pdf_pages
 from core.schemas import ServiceResult, PageProcessingResponse
+from .batch import build_batch_backend
+from .packing import PackSizer, pack_pages, split_answers
+from .prefilter import PageFilter
+from .preprocess import PreparedPage, PreprocessStats, prepare_page, preprocess_fingerprint
+
+PAGE_PROMPTS = ("math_problem", "page_text", "page_packing")
 
 
 class ProcessingService:
     def __init__(self):
-        self.client = genai.Client(
-            api_key=settings.GEMINI_API_KEY,
+        self.result_cache = build_result_cache(
+            "page result",
+            backend=settings.PAGE_CACHE_BACKEND,
+            max_entries=settings.PAGE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.PAGE_CACHE_TTL_SECONDS,
+            collection=settings.PAGE_CACHE_COLLECTION,
+        )
+        self.preprocess_stats = PreprocessStats()
+        self.pack_sizer = PackSizer(
+            initial=settings.PROCESSING_PACK_SIZE,
+            maximum=settings.PROCESSING_PACK_MAX_SIZE if settings.PROCESSING_PACK_SIZE > 1 else 1,
+            latency_target=settings.PROCESSING_PACK_LATENCY_TARGET_SECONDS,
         )
-        self.storage_client = storage.Client()
+        self.batch_backend = build_batch_backend()
+        self._staged_uploads = TTLCache(maxsize=settings.PROCESSING_HANDOFF_MAX_FILES, ttl=settings.PROCESSING_HANDOFF_TTL_SECONDS)
+        self._staged_uploads_lock = threading.Lock()
+
+    @property
+    def client(self):
+        return get_genai_client()
+
+    def stage_upload(self, job_id: str, file_bytes: bytes, content_type: str):
+        with self._staged_uploads_lock:
+            self._staged_uploads[job_id] = (file_bytes, content_type)
+
+    def get_file_for_job(self, job_id: str, gcs_path: str) -> (bytes, str):
+        with self._staged_uploads_lock:
+            staged = self._staged_uploads.pop(job_id, None)
+        if staged:
+            logging.info(f"Using staged upload for job {job_id}, skipping GCS download.")
+            return staged
+        return self.get_file_from_gcs(gcs_path)
 
     def get_file_from_gcs(self, gcs_path: str) -> (bytes, str):
         try:
-            bucket_name = settings.STORAGE_BUCKET
-            blob_name = gcs_path.replace(f"gs://{bucket_name}/", "")
-            bucket = self.storage_client.bucket(bucket_name)
-            blob = bucket.blob(blob_name)
-            blob.reload()
+            blob_name = gcs_path.replace(f"gs://{settings.STORAGE_BUCKET}/", "")
+            blob = get_bucket().blob(blob_name)
+            with timed("gcs_download"):
+                file_bytes = blob.download_as_bytes()
             content_type = blob.content_type
-            file_bytes = blob.download_as_bytes()
             return file_bytes, content_type
         except Exception as e:
             logging.error(f"Error downloading file from GCS: {e}")
             raise
 
-    def process_page(self, data) -> ServiceResult:
-        prompt = settings.PROMPTS_CONFIG.get(
-            "math_problem",
-        )
-        try:
-            if isinstance(data, tuple) and data[0] == "IMAGE":
-                _, file_bytes, content_type = data
-                file_base64 = base64.b64encode(file_bytes).decode("utf-8")
-                file_part = {
-                    "inline_data": {"mime_type": content_type, "data": file_base64}
-                }
-            else:
-                pdf_bytes = data
-                pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
-                file_part = {
-                    "inline_data": {"mime_type": "application/pdf", "data": pdf_base64}
-                }
-            contents = [prompt, file_part]
-            response = self.client.models.generate_content(
+    @staticmethod
+    def _inline_part(data: bytes, mime_type: str) -> dict:
+        return {
+            "inline_data": {"mime_type": mime_type, "data": base64.b64encode(data).decode("utf-8")}
+        }
+
+    def _prepare(self, data) -> PreparedPage:
+        with timed("encode"):
+            page = prepare_page(data)
+        self.preprocess_stats.record(page)
+        return page
+
+    def _prepare_pages(self, pages):
+        for page_number, page_data in pages:
+            yield page_number, self._prepare(page_data)
+
+    def _page_parts(self, page: PreparedPage) -> (list, str):
+        if page.text is None:
+            return [self._inline_part(page.data, page.mime_type)], page.transform
+        parts = [settings.PROMPTS_CONFIG.get("page_text", "") + "\n" + page.text]
+        parts.extend(self._inline_part(crop, mime_type) for crop, mime_type in page.crops)
+        return parts, page.transform
+
+    def _generate(self, contents: list) -> (PageProcessingResponse, dict):
+        with timed("model_call"):
+            response = gemini_governor.generate_content(
+                self.client,
                 model=settings.GEMINI_MODEL_NAME,
                 contents=contents,
                 config={
@@ -56,21 +104,38 @@ class ProcessingService:
                     "response_schema": PageProcessingResponse,
                 },
             )
-            response = response.parsed
-            logging.info(f"Response: {response}")
-            legacy_format = [
-                {
-                    "question": qa.question.replace("<br>", "\n\n").replace("\n", "\n\n").replace("<div>", "").replace("</div>", ""),
-                    "answer": qa.answer.replace("<br>", "\n\n").replace("\n", "\n\n").replace("<div>", "").replace("</div>", ""),
-                }
-                for qa in response.questions_and_answers
-                if qa.is_homework_problem
-            ]
+        tokens = usage_tokens(getattr(response, "usage_metadata", None))
+        logging.debug(f"Response: {response.parsed}")
+        return response.parsed, tokens
+
+    @staticmethod
+    def _legacy_format(response: PageProcessingResponse) -> list:
+        return [
+            {
+                "question": qa.question.replace("<br>", "\n\n").replace("\n", "\n\n").replace("<div>", "").replace("</div>", ""),
+                "answer": qa.answer.replace("<br>", "\n\n").replace("\n", "\n\n").replace("<div>", "").replace("</div>", ""),
+                "page_number": qa.page_number,
+            }
+            for qa in response.questions_and_answers
+            if qa.is_homework_problem
+        ]
+
+    def process_page(self, page: PreparedPage) -> ServiceResult:
+        prompt = settings.PROMPTS_CONFIG.get(
+            "math_problem",
+        )
+        try:
+            parts, path = self._page_parts(page)
+            response, tokens = self._generate([prompt, *parts])
+            with timed("parse"):
+                legacy_format = self._legacy_format(response)
+                for qa in legacy_format:
+                    qa.pop("page_number")
             logging.info(
-                f"Successfully processed page with {len(legacy_format)} questions."
+                f"Successfully processed page ({path}) with {len(legacy_format)} questions."
             )
             return ServiceResult.success_result(
-                data=legacy_format,
+                data={"results": legacy_format, "path": path, "tokens": tokens},
                 message=f"Page processed successfully with {len(legacy_format)} questions",
             )
         except Exception as e:
@@ -78,65 +143,380 @@ class ProcessingService:
             logging.error(msg)
             return ServiceResult.failure_result(message=msg, status_code=500)
 
-    def solve_from_gcs_path(self, job_id: str, gcs_path: str):
-        logging.info(f"Starting solving process for job {job_id} with file {gcs_path}.")
+    def process_pack(self, pack: list) -> ServiceResult:
+        if len(pack) == 1:
+            page_number, page_data = pack[0]
+            result = self.process_page(page_data)
+            if not result.success:
+                return result
+            return ServiceResult.success_result(data={page_number: result.data})
+        prompt = settings.PROMPTS_CONFIG.get("math_problem", "") + settings.PROMPTS_CONFIG.get("page_packing", "")
         try:
-            file_bytes, content_type = self.get_file_from_gcs(gcs_path)
+            contents = [prompt]
+            paths = {}
+            for page_number, page_data in pack:
+                parts, paths[page_number] = self._page_parts(page_data)
+                contents.extend([f"Page {page_number}", *parts])
+            response, tokens = self._generate(contents)
+            with timed("parse"):
+                answers = self._legacy_format(response)
+                results = split_answers(pack, answers)
+            if results is None:
+                return ServiceResult.failure_result("Model attributed questions to pages outside the pack", 502)
             logging.info(
-                f"Retrieved file from GCS. Content type: {content_type}, File size: {len(file_bytes)} bytes"
+                f"Successfully processed {len(pack)} packed pages with {len(answers)} questions."
             )
-            page_pdfs = []
-            if content_type and "pdf" in content_type.lower():
-                logging.info(f"Processing as PDF file. Content type: {content_type}")
-                pdf_document = fitz.open(stream=file_bytes, filetype="pdf")
-                firestore_service.update_job(job_id, {"page_count": len(pdf_document)})
-                for page_num in range(len(pdf_document)):
-                    single_page_pdf = fitz.open()
-                    single_page_pdf.insert_pdf(
-                        pdf_document, from_page=page_num, to_page=page_num
+            return ServiceResult.success_result(data={
+                page_number: {
+                    "results": page_results,
+                    "path": f"packed/{paths[page_number]}",
+                    "tokens": {kind: round(count / len(pack)) for kind, count in tokens.items()},
+                }
+                for page_number, page_results in results.items()
+            })
+        except Exception as e:
+            msg = f"Packed page processing failed: {str(e)}"
+            logging.error(msg)
+            return ServiceResult.failure_result(message=msg, status_code=500)
+
+    def page_cache_key(self, data) -> str:
+        if isinstance(data, PreparedPage):
+            data = data.source
+        prompts = [settings.PROMPTS_CONFIG.get(name, "") for name in PAGE_PROMPTS]
+        page_bytes = data[1] if isinstance(data, tuple) else data
+        key = hashlib.sha256()
+        for part in (
+            settings.GEMINI_MODEL_NAME.encode("utf-8"),
+            *(prompt.encode("utf-8") for prompt in prompts),
+            preprocess_fingerprint().encode("utf-8"),
+            page_bytes,
+        ):
+            key.update(hashlib.sha256(part).digest())
+        return key.hexdigest()
+
+    def process_pack_cached(self, pack: list) -> ServiceResult:
+        if not self.result_cache:
+            return self.process_pack(pack)
+        results = {}
+        uncached = []
+        cache_keys = {}
+        for page_number, page_data in pack:
+            cache_keys[page_number] = self.page_cache_key(page_data)
+            cached_results = self.result_cache.get(cache_keys[page_number])
+            if cached_results is None:
+                uncached.append((page_number, page_data))
+            else:
+                results[page_number] = {"results": cached_results, "path": "cache", "tokens": {}}
+        if uncached:
+            result = self.process_pack(uncached)
+            if not result.success:
+                return result
+            for page_number, page_result in result.data.items():
+                self.result_cache.set(cache_keys[page_number], page_result["results"])
+                results[page_number] = page_result
+        return ServiceResult.success_result(data=results)
+
+    def process_pages(self, job_id: str, pages, skip_pages: set = frozenset(), writer=None, final_attempt: bool = True) -> list:
+        writer = writer or firestore_service.job_writer(job_id)
+        max_in_flight = max(1, settings.PROCESSING_MAX_CONCURRENCY)
+        in_flight = {}
+        page_results = {}
+        usage = Counter()
+        failed_pages = None if final_attempt else set()
+        page_filter = PageFilter()
+        # Splitting, filtering and preprocessing all use PyMuPDF and stay on this thread; workers only call Gemini.
+        pending_pages = self._prepare_pages(self._filter_pages(pages, skip_pages, page_filter, writer, page_results))
+        with ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix=f"job-{job_id}"
+        ) as executor:
+            for pack in pack_pages(pending_pages, self.pack_sizer, settings.PROCESSING_PACK_MAX_BYTES):
+                if len(in_flight) >= max_in_flight:
+                    self._collect_finished_pages(writer, executor, in_flight, page_results, failed_pages, usage)
+                logging.info(f"Processing pages {[n for n, _ in pack]} for job {job_id}.")
+                self._submit_pack(executor, in_flight, pack, 1)
+            while in_flight:
+                self._collect_finished_pages(writer, executor, in_flight, page_results, failed_pages, usage)
+        JOB_TOKENS.observe(usage["total"])
+        logging.info(f"Gemini tokens for job {job_id}: {dict(usage)}")
+        if self.result_cache:
+            logging.info(f"Page result cache totals after job {job_id}: {self.result_cache.stats()}")
+        logging.info(f"Page filter totals for job {job_id}: {page_filter.snapshot()}")
+        logging.info(f"Page preprocessing totals after job {job_id}: {self.preprocess_stats.snapshot()}")
+        logging.info(f"Gemini governor totals after job {job_id}: {gemini_governor.snapshot()}")
+        if failed_pages:
+            raise RuntimeError(f"Pages {sorted(failed_pages)} failed and will be retried")
+        return [page_results[page_number] for page_number in sorted(page_results)]
+
+    @staticmethod
+    def _filter_pages(pages, skip_pages: set, page_filter: PageFilter, writer, page_results: dict = None):
+        for page_number, page_data in pages:
+            if page_number in skip_pages:
+                continue
+            skip = page_filter.check(page_number, page_data)
+            if skip is None:
+                yield page_number, page_data
+                continue
+            logging.info(f"Skipping page {page_number} without a model call: {skip}")
+            if page_results is not None:
+                page_results[page_number] = []
+            writer.add_page_result(page_number, [], processing_path="skipped", **skip)
+
+    def _submit_pack(self, executor, in_flight: dict, pack: list, attempt: int):
+        future = executor.submit(self.process_pack_cached, pack)
+        in_flight[future] = (pack, attempt, time.monotonic())
+
+    def _collect_finished_pages(
+        self, writer, executor, in_flight: dict, page_results: dict, failed_pages: set = None, usage: Counter = None
+    ):
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            pack, attempt, started = in_flight.pop(future)
+            page_numbers = [page_number for page_number, _ in pack]
+            result = future.result()
+            if result.success:
+                if len(pack) > 1:
+                    self.pack_sizer.record_success(len(pack), time.monotonic() - started)
+                for page_number in page_numbers:
+                    entry = result.data[page_number]
+                    page_results[page_number] = entry["results"]
+                    if entry["tokens"]:
+                        PAGE_TOKENS.observe(entry["tokens"]["total"])
+                        if usage is not None:
+                            usage.update(entry["tokens"])
+                    writer.add_page_result(
+                        page_number, entry["results"], processing_path=entry["path"], tokens=entry["tokens"]
                     )
-                    pdf_byte_arr = io.BytesIO()
-                    single_page_pdf.save(pdf_byte_arr)
-                    single_page_pdf.close()
-                    page_pdfs.append(pdf_byte_arr.getvalue())
-                pdf_document.close()
-            elif (
-                content_type
-                and (
-                    "image" in content_type.lower()
-                    or content_type.lower().startswith("image/")
-                )
-            ) or (
-                not content_type
-                and gcs_path.lower().endswith(
-                    (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+                continue
+            if len(pack) > 1:
+                self.pack_sizer.record_failure(len(pack))
+                logging.warning(
+                    f"Splitting pages {page_numbers} after the packed request failed: {result.message}"
                 )
-            ):
-                logging.info(f"Processing image directly. Content type: {content_type}")
-                firestore_service.update_job(job_id, {"page_count": 1})
-                actual_content_type = content_type or "image/jpeg"
-                page_pdfs.append(("IMAGE", file_bytes, actual_content_type))
-            else:
+                middle = len(pack) // 2
+                self._submit_pack(executor, in_flight, pack[:middle], attempt)
+                self._submit_pack(executor, in_flight, pack[middle:], attempt)
+                continue
+            page_number = page_numbers[0]
+            if attempt < settings.PROCESSING_PAGE_MAX_ATTEMPTS:
                 logging.warning(
-                    f"Unknown content type: {content_type}, file path: {gcs_path}. Attempting to process as PDF."
+                    f"Retrying page {page_number} after attempt {attempt} failed: {result.message}"
                 )
-                firestore_service.update_job(job_id, {"page_count": 1})
-                page_pdfs.append(file_bytes)
-            for i, page_data in enumerate(page_pdfs):
-                page_number = i + 1
-                logging.info(f"Processing page {page_number} for job {job_id}.")
-                result = self.process_page(page_data)
-                if result.success:
-                    firestore_service.add_page_result(job_id, page_number, result.data)
-                else:
-                    logging.error(
-                        f"Failed to process page {page_number}: {result.message}"
+                self._submit_pack(executor, in_flight, pack, attempt + 1)
+                continue
+            logging.error(
+                f"Failed to process page {page_number}: {result.message}"
+            )
+            if failed_pages is not None:
+                failed_pages.add(page_number)
+                continue
+            page_results[page_number] = []
+            writer.add_page_result(page_number, page_results[page_number], processing_path="failed")
+
+    def load_pages(self, job_id: str, gcs_path: str):
+        file_bytes, content_type = self.get_file_for_job(job_id, gcs_path)
+        logging.info(
+            f"Retrieved file. Content type: {content_type}, File size: {len(file_bytes)} bytes"
+        )
+        if content_type and "pdf" in content_type.lower():
+            logging.info(f"Processing as PDF file. Content type: {content_type}")
+            pdf_document = open_pdf(file_bytes)
+            firestore_service.update_job(job_id, {"page_count": len(pdf_document)})
+            pages = iter_pdf_pages(pdf_document)
+        elif (
+            content_type
+            and (
+                "image" in content_type.lower()
+                or content_type.lower().startswith("image/")
+            )
+        ) or (
+            not content_type
+            and gcs_path.lower().endswith(
+                (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+            )
+        ):
+            logging.info(f"Processing image directly. Content type: {content_type}")
+            firestore_service.update_job(job_id, {"page_count": 1})
+            actual_content_type = content_type or "image/jpeg"
+            pages = [("IMAGE", file_bytes, actual_content_type)]
+        else:
+            logging.warning(
+                f"Unknown content type: {content_type}, file path: {gcs_path}. Attempting to process as PDF."
+            )
+            firestore_service.update_job(job_id, {"page_count": 1})
+            pages = [file_bytes]
+        return enumerate(pages, start=1)
+
+    def solve_from_gcs_path(self, job_id: str, gcs_path: str, final_attempt: bool = True) -> ServiceResult:
+        logging.info(f"Starting solving process for job {job_id} with file {gcs_path}.")
+        try:
+            pages = self.load_pages(job_id, gcs_path)
+            processed_pages = firestore_service.get_processed_page_numbers(job_id)
+            if processed_pages:
+                logging.info(f"Resuming job {job_id}, skipping {len(processed_pages)} processed pages.")
+            # With nothing written yet there is no stored first question, so close() need not read the job back.
+            writer = firestore_service.job_writer(job_id, job=None if processed_pages else {})
+            try:
+                with timed("solve"):
+                    self.process_pages(
+                        job_id, pages, skip_pages=processed_pages, writer=writer, final_attempt=final_attempt
                     )
-                    firestore_service.add_page_result(job_id, page_number, [])
-            firestore_service.update_job(job_id, {"status": "completed"})
+            except Exception:
+                writer.close()
+                raise
+            close_result = writer.close({"status": "completed"})
+            if not close_result.success:
+                raise RuntimeError(f"Could not save results: {close_result.message}")
             logging.info(f"Successfully completed job {job_id}.")
+            return ServiceResult.success_result()
         except Exception as e:
             logging.error(f"Error during solve_from_gcs_path for job {job_id}: {e}")
-            firestore_service.update_job(
-                job_id, {"status": "failed", "error_message": str(e)}
-            )
\ No newline at end of file
+            if final_attempt:
+                firestore_service.update_job(
+                    job_id, {"status": "failed", "error_message": str(e)}
+                )
+            return ServiceResult.failure_result(message=str(e), status_code=500)
+
+    def _batch_request(self, page: PreparedPage) -> dict:
+        parts, path = self._page_parts(page)
+        return {
+            "contents": [settings.PROMPTS_CONFIG.get("math_problem", ""), *parts],
+            "path": path,
+            "config": {
+                "response_mime_type": "application/json",
+                "response_schema": PageProcessingResponse,
+            },
+        }
+
+    def submit_batch(self, job_id: str, gcs_path: str, final_attempt: bool = True) -> ServiceResult:
+        logging.info(f"Submitting batch processing for job {job_id} with file {gcs_path}.")
+        try:
+            processed_pages = firestore_service.get_processed_page_numbers(job_id)
+            writer = firestore_service.job_writer(job_id, job=None if processed_pages else {})
+            batch_jobs = []
+            chunk = {"requests": [], "page_numbers": [], "paths": [], "bytes": 0}
+
+            def submit_chunk():
+                name = self.batch_backend.submit(f"job-{job_id}-{len(batch_jobs) + 1}", chunk["requests"])
+                batch_jobs.append({"name": name, "page_numbers": chunk["page_numbers"], "paths": chunk["paths"]})
+
+            page_filter = PageFilter()
+            pages = self._filter_pages(self.load_pages(job_id, gcs_path), processed_pages, page_filter, writer)
+            for page_number, page_data in pages:
+                cached_results = self.result_cache.get(self.page_cache_key(page_data)) if self.result_cache else None
+                if cached_results is not None:
+                    writer.add_page_result(page_number, cached_results, processing_path="cache")
+                    continue
+                request = self._batch_request(self._prepare(page_data))
+                request_bytes = sum(
+                    len(part["inline_data"]["data"]) if isinstance(part, dict) else len(part) for part in request["contents"][1:]
+                )
+                if chunk["requests"] and chunk["bytes"] + request_bytes > settings.PROCESSING_BATCH_MAX_INLINE_BYTES:
+                    submit_chunk()
+                    chunk = {"requests": [], "page_numbers": [], "paths": [], "bytes": 0}
+                chunk["requests"].append(request)
+                chunk["page_numbers"].append(page_number)
+                chunk["paths"].append(request.pop("path"))
+                chunk["bytes"] += request_bytes
+            if chunk["requests"]:
+                submit_chunk()
+            job_update = {"status": "completed"} if not batch_jobs else {
+                "batch": {"jobs": batch_jobs, "submitted_at": datetime.datetime.now(datetime.timezone.utc)}
+            }
+            close_result = writer.close(job_update)
+            if not close_result.success:
+                raise RuntimeError(f"Could not save batch state: {close_result.message}")
+            logging.info(f"Page filter totals for job {job_id}: {page_filter.snapshot()}")
+            logging.info(f"Job {job_id} submitted as {len(batch_jobs)} Gemini batches.")
+            return ServiceResult.success_result(data={"pending": bool(batch_jobs)})
+        except Exception as e:
+            logging.error(f"Error submitting batch for job {job_id}: {e}")
+            if final_attempt:
+                firestore_service.update_job(
+                    job_id, {"status": "failed", "error_message": str(e)}
+                )
+            return ServiceResult.failure_result(message=str(e), status_code=500)
+
+    def _parse_batch_response(self, text: str) -> list:
+        with timed("parse"):
+            results = self._legacy_format(PageProcessingResponse.model_validate_json(text))
+            for qa in results:
+                qa.pop("page_number")
+        return results
+
+    def poll_batch(self, job_id: str, gcs_path: str, final_attempt: bool = True) -> ServiceResult:
+        job_result = firestore_service.get_job(job_id)
+        if not job_result.success:
+            return job_result
+        batch = job_result.data.get("batch") or {}
+        batch_jobs = batch.get("jobs") or []
+        try:
+            writer = firestore_service.job_writer(job_id, job=job_result.data)
+            failed_pages = []
+            running_jobs = []
+            for batch_job in batch_jobs:
+                if batch_job.get("collected"):
+                    continue
+                status = self.batch_backend.get(batch_job["name"])
+                if status.running:
+                    running_jobs.append(batch_job)
+                    continue
+                if status.state == "succeeded":
+                    paths = batch_job.get("paths") or ["passthrough"] * len(batch_job["page_numbers"])
+                    for page_number, path, (text, error, usage) in zip(batch_job["page_numbers"], paths, status.responses):
+                        try:
+                            if error or not text:
+                                raise ValueError(error or "empty response")
+                            results = self._parse_batch_response(text)
+                        except Exception as e:
+                            logging.warning(f"Batch result for page {page_number} of job {job_id} unusable: {e}")
+                            failed_pages.append(page_number)
+                            continue
+                        tokens = record_usage(usage)
+                        PAGE_TOKENS.observe(tokens["total"])
+                        writer.add_page_result(page_number, results, processing_path=f"batch/{path}", tokens=tokens)
+                    failed_pages.extend(batch_job["page_numbers"][len(status.responses):])
+                else:
+                    failed_pages.extend(batch_job["page_numbers"])
+                batch_job["collected"] = True
+            submitted_at = batch.get("submitted_at")
+            expired = submitted_at and (
+                datetime.datetime.now(datetime.timezone.utc) - submitted_at
+            ).total_seconds() > settings.PROCESSING_BATCH_MAX_WAIT_SECONDS
+            pending = bool(running_jobs)
+            if pending and not expired:
+                close_result = writer.close({"batch.jobs": batch_jobs})
+                if not close_result.success:
+                    raise RuntimeError(f"Could not save batch results: {close_result.message}")
+                return ServiceResult.success_result(data={"done": False})
+            if failed_pages or pending:
+                for batch_job in running_jobs:
+                    try:
+                        self.batch_backend.cancel(batch_job["name"])
+                    except Exception as e:
+                        logging.warning(f"Could not cancel expired batch {batch_job['name']} for job {job_id}: {e}")
+                    batch_job["cancelled"] = True
+                    batch_job["collected"] = True
+                close_result = writer.close({"batch.jobs": batch_jobs})
+                if not close_result.success:
+                    raise RuntimeError(f"Could not save batch results: {close_result.message}")
+                logging.info(
+                    f"Batch for job {job_id} left {len(failed_pages)} failed pages"
+                    f"{' and timed out' if pending else ''}; finishing them interactively."
+                )
+                result = self.solve_from_gcs_path(job_id, gcs_path, final_attempt=final_attempt)
+            else:
+                close_result = writer.close({"status": "completed", "batch.jobs": batch_jobs})
+                if not close_result.success:
+                    raise RuntimeError(f"Could not save batch results: {close_result.message}")
+                logging.info(f"Successfully completed batch job {job_id}.")
+                result = ServiceResult.success_result()
+            if not result.success:
+                return result
+            return ServiceResult.success_result(data={"done": True})
+        except Exception as e:
+            logging.error(f"Error polling batch for job {job_id}: {e}")
+            if final_attempt:
+                firestore_service.update_job(
+                    job_id, {"status": "failed", "error_message": str(e)}
+                )
+            return ServiceResult.failure_result(message=str(e), status_code=500)
@@ -0,0 +1,29 @@
+import os
+import sys
+from types import SimpleNamespace
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PROJECT_ID", "test")
+os.environ.setdefault("STORAGE_BUCKET", "test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+
+@pytest.fixture
+def env(monkeypatch):
+    from benchmarks.fakes import FakeFirestoreClient, FakeGeminiClient, FakeStorageClient
+    from benchmarks.suite import respond
+    from config import settings
+    from core import clients
+    clients.reset_clients()
+    env = SimpleNamespace(
+        genai=FakeGeminiClient(latency=0.01, jitter=0.0, respond=respond),
+        storage=FakeStorageClient(),
+        firestore=FakeFirestoreClient(),
+    )
+    for name in ("genai", "storage", "firestore"):
+        clients.set_client(name, getattr(env, name))
+    monkeypatch.setattr(settings, "PAGE_CACHE_BACKEND", "none")
+    monkeypatch.setattr(settings, "PROCESSING_MAX_CONCURRENCY", 4)
+    yield env
+    clients.reset_clients()
@@ -0,0 +1,71 @@
+import datetime
+from benchmarks.corpus import build_pdf
+from config import settings
+from core.firestore import firestore_service
+from modules.processing.batch import BatchStatus
+from modules.processing.services import ProcessingService
+
+
+class StuckBatchBackend:
+    def __init__(self):
+        self.submitted = []
+        self.cancelled = []
+
+    def submit(self, display_name: str, requests: list) -> str:
+        self.submitted.append(f"batches/{display_name}")
+        return self.submitted[-1]
+
+    def get(self, name: str) -> BatchStatus:
+        return BatchStatus("running")
+
+    def cancel(self, name: str):
+        self.cancelled.append(name)
+
+
+def _submitted_job(env, backend):
+    env.storage.bucket(settings.STORAGE_BUCKET).blob("upload.pdf").upload_from_string(
+        build_pdf("text", 3), content_type="application/pdf"
+    )
+    gcs_path = f"gs://{settings.STORAGE_BUCKET}/upload.pdf"
+    job_id = firestore_service.create_job("user", gcs_path, mode="batch").data["job_id"]
+    service = ProcessingService()
+    service.batch_backend = backend
+    assert service.submit_batch(job_id, gcs_path).data == {"pending": True}
+    return service, job_id, gcs_path
+
+
+def test_pending_batch_is_left_running(env):
+    backend = StuckBatchBackend()
+    service, job_id, gcs_path = _submitted_job(env, backend)
+    assert service.poll_batch(job_id, gcs_path).data == {"done": False}
+    assert backend.cancelled == []
+
+
+def test_expired_batch_is_cancelled_before_interactive_fallback(env):
+    backend = StuckBatchBackend()
+    service, job_id, gcs_path = _submitted_job(env, backend)
+    job = env.firestore.documents[("jobs", job_id)]
+    job["batch"]["submitted_at"] -= datetime.timedelta(seconds=settings.PROCESSING_BATCH_MAX_WAIT_SECONDS + 1)
+    assert service.poll_batch(job_id, gcs_path).success
+    job = env.firestore.documents[("jobs", job_id)]
+    assert backend.cancelled == backend.submitted
+    assert all(batch_job["cancelled"] and batch_job["collected"] for batch_job in job["batch"]["jobs"])
+    assert job["status"] == "completed"
+    assert job["processed_pages"] == 3
+
+
+def test_failed_save_stops_the_interactive_fallback(env, monkeypatch):
+    backend = StuckBatchBackend()
+    service, job_id, gcs_path = _submitted_job(env, backend)
+    job = env.firestore.documents[("jobs", job_id)]
+    job["batch"]["submitted_at"] -= datetime.timedelta(seconds=settings.PROCESSING_BATCH_MAX_WAIT_SECONDS + 1)
+    solved = []
+    monkeypatch.setattr(service, "solve_from_gcs_path", lambda *args, **kwargs: solved.append(args))
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("Firestore unavailable")
+
+    monkeypatch.setattr(env.firestore, "write", unavailable)
+    result = service.poll_batch(job_id, gcs_path, final_attempt=False)
+    assert not result.success
+    assert solved == []
@@ -0,0 +1,77 @@
+import pytest
+from benchmarks.fakes import FakeFirestoreClient
+from core import clients
+from core.firestore import firestore_service
+
+
+@pytest.fixture
+def db():
+    clients.reset_clients()
+    client = FakeFirestoreClient()
+    clients.set_client("firestore", client)
+    yield client
+    clients.reset_clients()
+
+
+def _job(db, job_id):
+    return db.documents[("jobs", job_id)]
+
+
+def test_first_question_comes_from_lowest_page_with_results(db):
+    job_id = firestore_service.create_job("user", "gs://bucket/file.pdf").data["job_id"]
+    writer = firestore_service.job_writer(job_id, flush_pages=1, flush_seconds=0)
+    writer.add_page_result(1, [], skip_reason="sparse")
+    writer.add_page_result(4, [{"question": "Solve 4x = 8."}])
+    writer.add_page_result(2, [{"question": "Solve x + 1 = 3."}])
+    writer.close({"status": "completed"})
+    assert _job(db, job_id)["first_question"] == "Solve x + 1 = 3."
+    assert firestore_service.get_jobs_for_user("user").data["jobs"][0]["first_question"] == "Solve x + 1 = 3."
+
+
+def test_later_writer_keeps_lower_page(db):
+    job_id = firestore_service.create_job("user", "gs://bucket/file.pdf").data["job_id"]
+    first = firestore_service.job_writer(job_id, flush_pages=10, flush_seconds=0)
+    first.add_page_result(3, [{"question": "Page three."}])
+    first.close()
+    second = firestore_service.job_writer(job_id, flush_pages=10, flush_seconds=0)
+    second.add_page_result(5, [{"question": "Page five."}])
+    second.add_page_result(2, [{"question": "Page two."}])
+    second.close()
+    third = firestore_service.job_writer(job_id, flush_pages=10, flush_seconds=0)
+    third.add_page_result(4, [{"question": "Page four."}])
+    third.close({"status": "completed"})
+    assert _job(db, job_id)["first_question"] == "Page two."
+
+
+def test_job_without_questions_is_marked_on_completion(db):
+    job_id = firestore_service.create_job("user", "gs://bucket/file.pdf").data["job_id"]
+    writer = firestore_service.job_writer(job_id, flush_pages=10, flush_seconds=0)
+    writer.add_page_result(1, [], skip_reason="blank")
+    writer.close({"status": "completed"})
+    assert "first_question" in _job(db, job_id)
+    assert _job(db, job_id)["first_question"] is None
+
+
+def test_close_skips_the_job_read_when_the_caller_knows_the_job(db):
+    job_id = firestore_service.create_job("user", "gs://bucket/file.pdf").data["job_id"]
+    writer = firestore_service.job_writer(job_id, flush_pages=10, flush_seconds=0, job={})
+    writer.add_page_result(1, [{"question": "Page one."}])
+    calls = db.calls
+    writer.close({"status": "completed"})
+    assert db.calls == calls + 1
+    assert _job(db, job_id)["first_question"] == "Page one."
+
+
+def test_known_lower_first_question_is_kept(db):
+    job_id = firestore_service.create_job("user", "gs://bucket/file.pdf").data["job_id"]
+    writer = firestore_service.job_writer(job_id, flush_pages=10, flush_seconds=0, job={"first_question_page": 1})
+    writer.add_page_result(4, [{"question": "Page four."}])
+    writer.close()
+    assert "first_question" not in _job(db, job_id)
+
+
+def test_single_page_writes_do_not_read_the_job(db):
+    job_id = firestore_service.create_job("user", "gs://bucket/file.pdf").data["job_id"]
+    calls = db.calls
+    firestore_service.add_page_result(job_id, 2, [{"question": "Page two."}])
+    assert db.calls == calls + 1
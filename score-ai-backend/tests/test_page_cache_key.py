@@ -0,0 +1,34 @@
+import pytest
+from config import settings
+from modules.processing.services import ProcessingService
+
+
+@pytest.fixture
+def service():
+    return ProcessingService.__new__(ProcessingService)
+
+
+@pytest.mark.parametrize("prompt", ["math_problem", "page_text", "page_packing"])
+def test_key_changes_with_every_prompt(service, monkeypatch, prompt):
+    before = service.page_cache_key(b"page")
+    monkeypatch.setitem(settings.PROMPTS_CONFIG, prompt, settings.PROMPTS_CONFIG.get(prompt, "") + " v2")
+    assert service.page_cache_key(b"page") != before
+
+
+@pytest.mark.parametrize("name, value", [
+    ("PAGE_TEXT_ENABLED", False),
+    ("PAGE_TEXT_MIN_CHARS", 1),
+    ("PAGE_TEXT_MAX_CROPS", 0),
+    ("PAGE_IMAGE_DPI", 72),
+    ("PAGE_IMAGE_FORMAT", "PNG"),
+    ("PAGE_IMAGE_QUALITY", 10),
+])
+def test_key_changes_with_preprocessing_settings(service, monkeypatch, name, value):
+    before = service.page_cache_key(b"page")
+    monkeypatch.setattr(settings, name, value)
+    assert service.page_cache_key(b"page") != before
+
+
+def test_key_is_stable_for_same_page(service):
+    assert service.page_cache_key(("IMAGE", b"page")) == service.page_cache_key(b"page")
+    assert service.page_cache_key(b"page") != service.page_cache_key(b"other page")
@@ -0,0 +1,47 @@
+import threading
+import fitz
+from benchmarks.corpus import build_pdf
+from config import settings
+from core.firestore import firestore_service
+from modules.processing.services import ProcessingService
+
+
+def _record_threads(monkeypatch, owner, name) -> set:
+    threads = set()
+    original = getattr(owner, name)
+
+    def recorded(*args, **kwargs):
+        threads.add(threading.current_thread().name)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, name, recorded)
+    return threads
+
+
+def _solve(env, kind: str, pages: int) -> dict:
+    env.storage.bucket(settings.STORAGE_BUCKET).blob("upload.pdf").upload_from_string(
+        build_pdf(kind, pages), content_type="application/pdf"
+    )
+    gcs_path = f"gs://{settings.STORAGE_BUCKET}/upload.pdf"
+    job_id = firestore_service.create_job("user", gcs_path).data["job_id"]
+    assert ProcessingService().solve_from_gcs_path(job_id, gcs_path).success
+    return env.firestore.documents[("jobs", job_id)]
+
+
+def test_pymupdf_only_runs_on_the_producer_thread(env, monkeypatch):
+    opened = _record_threads(monkeypatch, fitz, "open")
+    job = _solve(env, "mixed", 12)
+    assert job["status"] == "completed"
+    assert job["processed_pages"] == 12
+    assert opened == {threading.current_thread().name}
+
+
+def test_text_layer_extraction_runs_on_the_producer_thread(env, monkeypatch):
+    recorded = [_record_threads(monkeypatch, fitz.Page, name) for name in ("get_text", "get_drawings", "get_pixmap")]
+    _solve(env, "text", 8)
+    paths = [
+        document["processing_path"] for path, document in env.firestore.documents.items() if path[2:3] == ("results",)
+    ]
+    assert len(paths) == 8
+    assert all(path.split("/")[-1] in ("text", "text+crops") for path in paths)
+    assert set().union(*recorded) == {threading.current_thread().name}
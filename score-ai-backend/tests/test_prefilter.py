@@ -0,0 +1,79 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import fitz
+import pytest
+
+from modules.processing.prefilter import PageFilter
+
+
+def pdf_page(text: str = "", fontsize: float = 12, point=(72, 72)) -> bytes:
+    with fitz.open() as document:
+        page = document.new_page(width=612, height=792)
+        if text:
+            page.insert_text(point, text, fontsize=fontsize)
+        return document.tobytes()
+
+
+@pytest.mark.parametrize("text", [
+    "Write a paragraph about your summer vacation.",
+    "Explain why the sky is blue.",
+    "Name the capital of France.",
+    "Describe the water cycle",
+    "a) Define photosynthesis.",
+    "Who wrote Hamlet",
+    "Is a tomato a fruit",
+])
+@pytest.mark.parametrize("page_number", [1, 2])
+def test_short_questions_and_instructions_are_kept(text, page_number):
+    assert PageFilter().check(page_number, pdf_page(text)) is None
+
+
+@pytest.mark.parametrize("text", ["Is a tomato a fruit?", "Explain your reasoning"])
+def test_title_sized_question_is_kept(text):
+    assert PageFilter().check(1, pdf_page(text, fontsize=24, point=(150, 300))) is None
+
+
+def test_short_text_without_cover_signal_is_kept():
+    assert PageFilter().check(3, pdf_page("Photosynthesis in desert plants")) is None
+
+
+@pytest.mark.parametrize("text, fontsize", [
+    ("Answer Key", 12),
+    ("This page intentionally left blank", 11),
+    ("Calculus Homework", 24),
+])
+def test_cover_and_separator_pages_are_skipped(text, fontsize):
+    assert PageFilter().check(1, pdf_page(text, fontsize=fontsize, point=(150, 300))) == {"skip_reason": "sparse"}
+
+
+def test_blank_and_duplicate_pages_are_skipped():
+    page_filter = PageFilter()
+    worksheet = pdf_page("Solve 3x + 4 = 19 and check your answer.")
+    assert page_filter.check(1, pdf_page()) == {"skip_reason": "blank"}
+    assert page_filter.check(2, worksheet) is None
+    assert page_filter.check(3, worksheet) == {"skip_reason": "duplicate", "duplicate_of": 2}
+
+
+def test_page_analysis_never_overlaps_other_pymupdf_calls(monkeypatch):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    get_pixmap = fitz.Page.get_pixmap
+
+    def tracked(*args, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        try:
+            return get_pixmap(*args, **kwargs)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(fitz.Page, "get_pixmap", tracked)
+    page_filter = PageFilter()
+    pages = [pdf_page(f"Solve {n}x + 1 = 0.") for n in range(8)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(page_filter.check, range(1, 9), pages))
+    assert peak[0] == 1
@@ -0,0 +1,30 @@
+import io
+import pytest
+from PIL import Image, ImageDraw
+from config import settings
+from modules.processing.preprocess import prepare_page
+
+
+def _transparent_png(mode: str, size=(4000, 3000)) -> bytes:
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for line in range(20):
+        draw.rectangle((200, 200 + line * 120, 3000, 240 + line * 120), fill=(0, 0, 0, 255))
+    if mode == "P":
+        image = image.convert("P")
+        image.info["transparency"] = image.getpixel((0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", **({"transparency": image.info["transparency"]} if mode == "P" else {}))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "P"])
+def test_transparent_png_is_flattened_on_white(monkeypatch, mode):
+    monkeypatch.setattr(settings, "PAGE_IMAGE_ENABLED", True)
+    monkeypatch.setattr(settings, "PAGE_IMAGE_FORMAT", "JPEG")
+    page = prepare_page(("IMAGE", _transparent_png(mode), "image/png"))
+    assert page.transform == "downscaled"
+    with Image.open(io.BytesIO(page.data)) as image:
+        gray = image.convert("L")
+        assert gray.getpixel((5, 5)) > 240
+        assert min(gray.getdata()) < 20
@@ -0,0 +1,75 @@
+import base64
+import io
+import os
+import google_crc32c
+import pytest
+from google.resumable_media import common
+from google.resumable_media.requests import ResumableUpload
+from core.storage import ChecksummedReader, UploadTooLargeError
+
+CHUNK = 256 * 1024
+
+
+class FlakyTransport:
+    def __init__(self):
+        self.received = bytearray()
+        self.failed = False
+
+    @staticmethod
+    def _response(status_code: int, headers: dict = None):
+        response = type("Response", (), {})()
+        response.status_code = status_code
+        response.headers = headers or {}
+        response.content = b"{}"
+        response.json = lambda: {}
+        return response
+
+    def request(self, method, url, data=None, headers=None, timeout=None, **kwargs):
+        if method == "POST":
+            return self._response(200, {"location": "https://upload.invalid/session"})
+        content_range = headers["content-range"]
+        if content_range.startswith("bytes */"):
+            return self._response(308, {"range": f"bytes=0-{len(self.received) - 1}"})
+        start = int(content_range.split(" ")[1].split("-")[0])
+        if start == CHUNK and not self.failed:
+            self.failed = True
+            return self._response(503)
+        self.received[start:start + len(data)] = data
+        if len(data) < CHUNK:
+            return self._response(200)
+        return self._response(308, {"range": f"bytes=0-{len(self.received) - 1}"})
+
+
+def test_resumable_upload_recovers_by_seeking_back_into_the_chunk():
+    data = os.urandom(CHUNK * 2 + 1000)
+    reader = ChecksummedReader(io.BytesIO(data), max_bytes=len(data))
+    transport = FlakyTransport()
+    upload = ResumableUpload("https://upload.invalid/init", CHUNK)
+    upload._retry_strategy = common.RetryStrategy(max_retries=0)
+    upload.initiate(transport, reader, {"name": "upload.pdf"}, "application/pdf", stream_final=False)
+    while not upload.finished:
+        try:
+            upload.transmit_next_chunk(transport)
+        except common.InvalidResponse:
+            upload.recover(transport)
+    assert transport.failed
+    assert bytes(transport.received) == data
+    assert reader.bytes_read == len(data)
+    assert reader.crc32c() == base64.b64encode(google_crc32c.Checksum(data).digest()).decode("ascii")
+
+
+def test_seek_is_limited_to_the_buffered_chunk():
+    reader = ChecksummedReader(io.BytesIO(b"a" * 10 + b"b" * 10), max_bytes=100)
+    assert reader.read(10) == b"a" * 10
+    assert reader.read(10) == b"b" * 10
+    reader.seek(12)
+    assert reader.tell() == 12
+    assert reader.read(100) == b"b" * 8
+    with pytest.raises(io.UnsupportedOperation):
+        reader.seek(5)
+
+
+def test_oversized_stream_is_rejected():
+    reader = ChecksummedReader(io.BytesIO(b"x" * 11), max_bytes=10)
+    with pytest.raises(UploadTooLargeError):
+        reader.read(-1)
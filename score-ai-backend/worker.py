@@ -0,0 +1,21 @@
+import argparse
+import logging
+from core.queue import job_queue, QueueWorker
+import modules.analysis.services  # noqa: F401  registers the task handlers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lease and run queued Score AI tasks.")
+    parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+    parser.add_argument("--poll-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s in %(module)s: %(message)s")
+    worker = QueueWorker(job_queue)
+    if args.once:
+        logging.info(f"Processed {worker.run_until_empty()} tasks.")
+    else:
+        worker.run_forever(poll_seconds=args.poll_seconds)
+
+
+if __name__ == "__main__":
+    main()